@@ -0,0 +1,87 @@
+#!/bin/env python3
+"""
+Compares the cold start cost of eager and lazy resource loading.
+
+Every sample runs in a fresh interpreter, importing pinthesky.resource
+and loading whatever the first request to a route prefix would require.
+
+    python3 benchmarks/cold_start.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+SAMPLE = """
+import json
+import time
+start = time.perf_counter()
+import pinthesky.resource as resource
+resource.load_resources_for_path({path!r})
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'modules': sorted(resource.loaded_resources.keys())
+}}))
+"""
+
+
+def sample(mode, path):
+    env = {
+        **os.environ,
+        'RESOURCE_LOADING': mode,
+    }
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    output = subprocess.run(
+        [sys.executable, '-c', SAMPLE.format(path=path)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "cold_start",
+        description="compares eager and lazy init time per route prefix")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="number of fresh interpreters sampled per route (default: 5)")
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="emit the results as JSON")
+    args = parser.parse_args()
+
+    from pinthesky.resource import RESOURCE_MANIFEST
+
+    results = []
+    for prefix in RESOURCE_MANIFEST.keys():
+        row = {'route': prefix}
+        for mode in ['eager', 'lazy']:
+            samples = [sample(mode, prefix) for _ in range(args.runs)]
+            row[mode] = statistics.median(s['seconds'] for s in samples)
+            row[f'{mode}Modules'] = len(samples[0]['modules'])
+        results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"route":<16}{"eager (ms)":>12}{"lazy (ms)":>12}{"modules":>10}')
+    for row in results:
+        print(''.join([
+            f'{row["route"]:<16}',
+            f'{row["eager"] * 1000:>12.1f}',
+            f'{row["lazy"] * 1000:>12.1f}',
+            f'{row["lazyModules"]:>6}/{row["eagerModules"]:<3}',
+        ]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/bin/env python3
+"""
+Measures the cost of resolving every registered route, comparing the
+compiled segment trie against the linear pattern scan it replaced.
+
+    python3 benchmarks/dispatch.py --number 10000
+
+The trie prefers static segments over parameters, so where the scan
+returns the first registered pattern, the trie returns the most
+specific one: GET /cameras/captureImage wins over /cameras/:thing_name.
+"""
+
+import argparse
+import json
+import os
+import re
+import timeit
+
+
+def linear_scan(router, method, path):
+    for rule, route in router.routes.items():
+        rule_method, pattern = rule.split(':', 1)
+        if rule_method == method:
+            match = re.search(pattern, path)
+            if pattern == path or match is not None:
+                return route, list(match.groups())
+    return None
+
+
+def most_specific(router, method, path):
+    """
+    Ranks every registered path matching the request, left to right,
+    with a static segment ahead of a parameter.
+    """
+    segments = path[1:].split('/')
+    matches = []
+    for rule_method, rule_path in router.paths:
+        rule_segments = rule_path[1:].split('/')
+        if rule_method != method or len(rule_segments) != len(segments):
+            continue
+        if all(r.startswith(':') or r == s for r, s in zip(rule_segments, segments)):
+            rank = [r.startswith(':') for r in rule_segments]
+            values = [s for r, s in zip(rule_segments, segments) if r.startswith(':')]
+            matches.append((rank, rule_path, values))
+    if len(matches) == 0:
+        return None
+    _, rule_path, values = min(matches)
+    pattern = '^' + re.sub(':[^/]+', '([^/]+)', rule_path) + '$'
+    return router.routes[f'{method}:{pattern}'], values
+
+
+def sample_path(path):
+    return '/'.join(
+        f'{segment[1:]}-value' if segment.startswith(':') else segment
+        for segment in path.split('/'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "dispatch",
+        description="measures the dispatch cost of every registered route")
+    parser.add_argument(
+        "--number",
+        type=int,
+        default=10000,
+        help="resolutions timed per route (default: 10000)")
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="emit the results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    from pinthesky.resource import api
+
+    results = []
+    for method, path in api.paths:
+        request_path = sample_path(path)
+        compiled = api.resolve(method, request_path)
+        expected = most_specific(api, method, request_path)
+        assert compiled == expected, f'{method} {path} resolved differently'
+        row = {'method': method, 'route': path}
+        for name, func in [('trie', api.resolve), ('linear', linear_scan)]:
+            call_args = (method, request_path)
+            if func is linear_scan:
+                call_args = (api, method, request_path)
+            seconds = timeit.timeit(lambda: func(*call_args), number=args.number)
+            row[name] = seconds / args.number * 1e9
+        results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"route":<70}{"trie (ns)":>12}{"linear (ns)":>14}')
+    for row in results:
+        print(''.join([
+            f'{row["method"] + " " + row["route"]:<70}',
+            f'{row["trie"]:>12.0f}',
+            f'{row["linear"]:>14.0f}',
+        ]))
+    total = len(results)
+    print(''.join([
+        f'{"mean of " + str(total) + " routes":<70}',
+        f'{sum(r["trie"] for r in results) / total:>12.0f}',
+        f'{sum(r["linear"] for r in results) / total:>14.0f}',
+    ]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import logging
+import os
+from botocore.exceptions import BotoCoreError, ClientError
+from collections import namedtuple
+from random import random
+from time import sleep
+from ophis.globals import app_context
+from pinthesky.concurrency import MAX_WORKERS, map_concurrently
+
+
+MAX_READ_KEYS = 100
+MAX_WRITE_ITEMS = 25
+BATCH_MAX_ATTEMPTS = int(os.getenv('BATCH_MAX_ATTEMPTS', '8'))
+BACKOFF_BASE_MS = 25
+BACKOFF_CAP_MS = 1000
+
+BatchResult = namedtuple('BatchResult', field_names=[
+    'failures', 'round_trips', 'retries'
+])
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt, base_ms=BACKOFF_BASE_MS, cap_ms=BACKOFF_CAP_MS):
+    """
+    Full jitter exponential backoff: a random delay up to the capped
+    exponential bound, so throttled requests do not retry in lock step.
+    """
+    return random() * min(cap_ms, base_ms * 2 ** attempt) / 1000
+
+
+class UnprocessedKeysException(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+def batch_get(
+        *args,
+        reads,
+        ddb=None,
+        table=None,
+        max_workers=MAX_WORKERS,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+        sleep=sleep):
+    """
+    Reads items like Repository.batch_read, but in 100 key requests run in
+    parallel, returning one entry per read in request order with None
+    where the item does not exist.
+    """
+    if table is None:
+        table = app_context.resolve('GLOBAL')['table']
+    if ddb is None:
+        ddb = app_context.resolve('GLOBAL')['dynamodb']
+    keys = []
+    for entry in reads:
+        parent_ids = list(args) + list(entry.get('parent_ids', []))
+        keys.append((
+            entry['repository'].make_hash_key(*parent_ids),
+            entry['id']
+        ))
+    unique_keys = list(dict.fromkeys(keys))
+
+    def read(chunk):
+        request_items = {
+            table.name: {
+                'Keys': [{'PK': pk, 'SK': sk} for pk, sk in chunk]
+            }
+        }
+        items = []
+        round_trips = 0
+        while True:
+            round_trips += 1
+            resp = ddb.batch_get_item(RequestItems=request_items)
+            items.extend(resp['Responses'].get(table.name, []))
+            request_items = resp.get('UnprocessedKeys', {})
+            if len(request_items) == 0:
+                return items
+            if round_trips >= max_attempts:
+                raise UnprocessedKeysException(
+                    f'Failed to read {len(request_items[table.name]["Keys"])} keys '
+                    f'after {round_trips} round trips.')
+            sleep(backoff_delay(round_trips - 1))
+
+    found = {}
+    for items in map_concurrently(read, [
+        unique_keys[start:start + MAX_READ_KEYS]
+        for start in range(0, len(unique_keys), MAX_READ_KEYS)
+    ], max_workers=max_workers):
+        for item in items:
+            found[(item['PK'], item['SK'])] = item
+    return [
+        entry['repository'].prune_dto(found.get(key, None))
+        for entry, key in zip(reads, keys)
+    ]
+
+
+def write_request(*args, update):
+    keys = list(args) + list(update.get('parent_ids', []))
+    dto = update['repository'].make_dto(
+        *keys,
+        item=update['item'],
+        time_fields=['create', 'update'])
+    if update.get('delete', False):
+        return {'DeleteRequest': {'Key': {'PK': dto['PK'], 'SK': dto['SK']}}}
+    return {'PutRequest': {'Item': dto}}
+
+
+def _request_key(request):
+    if 'PutRequest' in request:
+        item = request['PutRequest']['Item']
+    else:
+        item = request['DeleteRequest']['Key']
+    return (item['PK'], item['SK'])
+
+
+def batch_write(
+        *args,
+        updates,
+        ddb=None,
+        table=None,
+        max_workers=MAX_WORKERS,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+        sleep=sleep):
+    """
+    Writes updates like Repository.batch_write, but in 25 item requests
+    run in parallel, retrying unprocessed items with backoff. The updates
+    that could not be written are returned as failures.
+    """
+    if table is None:
+        table = app_context.resolve('GLOBAL')['table']
+    if ddb is None:
+        ddb = app_context.resolve('GLOBAL')['dynamodb']
+    requests = {}
+    for update in updates:
+        if 'repository' not in update or 'item' not in update:
+            logger.warning(f'Update skipped to missing fields: {update}')
+            continue
+        request = write_request(*args, update=update)
+        # A single request cannot touch the same key twice, last one wins
+        requests[_request_key(request)] = (request, update)
+    keys = list(requests.keys())
+
+    def write(chunk):
+        request_items = {table.name: [requests[key][0] for key in chunk]}
+        round_trips = 0
+        while True:
+            round_trips += 1
+            try:
+                resp = ddb.batch_write_item(RequestItems=request_items)
+            except (BotoCoreError, ClientError) as e:
+                logger.warning(f'Failed to write {len(request_items[table.name])} items: {e}')
+                break
+            request_items = resp.get('UnprocessedItems', {})
+            if len(request_items) == 0 or round_trips >= max_attempts:
+                break
+            sleep(backoff_delay(round_trips - 1))
+        return [
+            requests[_request_key(request)][1]
+            for request in request_items.get(table.name, [])
+        ], round_trips
+
+    results = map_concurrently(write, [
+        keys[start:start + MAX_WRITE_ITEMS]
+        for start in range(0, len(keys), MAX_WRITE_ITEMS)
+    ], max_workers=max_workers)
+    result = BatchResult(
+        failures=[update for failures, _ in results for update in failures],
+        round_trips=sum(round_trips for _, round_trips in results),
+        retries=sum(round_trips - 1 for _, round_trips in results))
+    if result.retries > 0 or len(result.failures) > 0:
+        logger.info(
+            f'Wrote {len(keys) - len(result.failures)} of {len(keys)} items '
+            f'in {result.round_trips} round trips with {result.retries} retries')
+    return result
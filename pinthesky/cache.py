@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+class TTLCache:
+    """
+    A bounded, thread safe, per container cache whose entries expire
+    after a time to live. Hits and misses are counted for reporting.
+    """
+    def __init__(self, ttl, max_size=1024, clock=monotonic) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                expires, value = entry
+                if expires > self.clock():
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl=None):
+        expires = self.clock() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            return self.entries.pop(key, None) is not None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+        }
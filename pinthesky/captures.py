@@ -0,0 +1,143 @@
+import json
+from uuid import uuid4
+from botocore.exceptions import BotoCoreError, ClientError
+from pinthesky.concurrency import map_concurrently
+from pinthesky.s3 import generate_presigned_url
+
+
+LATEST_THUMBNAIL = "thumbnail_latest.jpg"
+DEFAULT_VIDEO_DURATION = 30
+MAX_TARGETS = 1000
+
+
+def publish_event(iot_data, thing_name, payload):
+    return iot_data.publish(
+        topic=f'pinthesky/events/{thing_name}/input',
+        payload=bytes(json.dumps(payload), encoding="utf8"))
+
+
+def capture_image_event(capture_id):
+    return {
+        "name": "capture_image",
+        "context": {
+            "file_name": LATEST_THUMBNAIL,
+            "capture_id": capture_id
+        }
+    }
+
+
+def capture_video_event(capture_id, body=None):
+    # When requested, we will default to a 30 second buffer.
+    duration = DEFAULT_VIDEO_DURATION
+    if body is not None:
+        duration = body.get('durationInSeconds', DEFAULT_VIDEO_DURATION)
+    return {
+        "name": "capture_video",
+        "context": {
+            "capture_id": capture_id,
+            "duration": duration,
+        }
+    }
+
+
+def health_event(health_id):
+    return {
+        "name": "health",
+        "context": {
+            "health_id": health_id
+        }
+    }
+
+
+def unique_targets(thing_names, max_targets=MAX_TARGETS):
+    """
+    Returns the distinct thing names in order, or None as soon as there
+    are more than max_targets of them.
+    """
+    targets = {}
+    for thing_name in thing_names:
+        targets[thing_name] = True
+        if len(targets) > max_targets:
+            return None
+    return list(targets)
+
+
+def publish_events(iot_data, thing_names, create_event):
+    """
+    Publishes an event with a unique id to every thing concurrently,
+    reporting the id, or the failure, for each thing in order.
+    """
+    def publish(thing_name):
+        event_id = str(uuid4())
+        try:
+            publish_event(iot_data, thing_name, create_event(event_id))
+            return {
+                'thingName': thing_name,
+                'id': event_id,
+                'status': 'succeeded'
+            }
+        except (BotoCoreError, ClientError) as e:
+            return {
+                'thingName': thing_name,
+                'status': 'failed',
+                'message': str(e)
+            }
+    return map_concurrently(publish, list(dict.fromkeys(thing_names)))
+
+
+def thumbnail_key(image_prefix, thing_name):
+    return f'{image_prefix}/{thing_name}/{LATEST_THUMBNAIL}'
+
+
+def lookup_thumbnail(s3, bucket_name, image_prefix, thing_name, include_url=False):
+    """
+    Returns the latest thumbnail metadata for a thing, or None when the
+    thing has not captured an image yet.
+    """
+    s3key = thumbnail_key(image_prefix, thing_name)
+    try:
+        resp = s3.head_object(Bucket=bucket_name, Key=s3key)
+    except ClientError as e:
+        if e.response['Error']['Code'] == '404':
+            return None
+        raise
+    rval = {
+        "id": s3key,
+        "contentType": resp['ContentType'],
+        "contentLength": resp['ContentLength'],
+        "lastModified": resp['LastModified'].isoformat()
+    }
+    if include_url:
+        rval['url'] = generate_presigned_url(s3, bucket_name, s3key)
+    return rval
+
+
+def lookup_thumbnails(s3, bucket_name, image_prefix, thing_names, include_url=False):
+    def lookup(thing_name):
+        try:
+            thumbnail = lookup_thumbnail(
+                s3,
+                bucket_name,
+                image_prefix,
+                thing_name,
+                include_url=include_url)
+        except (BotoCoreError, ClientError) as e:
+            # One denied or throttled lookup does not fail the others
+            return {
+                'thingName': thing_name,
+                'available': False,
+                'status': 'failed',
+                'message': str(e)
+            }
+        if thumbnail is None:
+            return {
+                'thingName': thing_name,
+                'available': False,
+                'message': 'capture image is not available'
+            }
+        return {
+            'thingName': thing_name,
+            'available': True,
+            **thumbnail
+        }
+    return map_concurrently(lookup, list(dict.fromkeys(thing_names)))
@@ -0,0 +1,71 @@
+from collections import namedtuple
+from ophis.database import QueryParams
+from pinthesky.batch import batch_write
+from pinthesky.concurrency import past_deadline
+from pinthesky.pages import PageIterator
+
+
+Relation = namedtuple('Relation', field_names=[
+    'repository', 'parent_ids', 'deletes', 'projection'
+], defaults=[None])
+
+
+class InvalidCascadeException(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+def edge_delete(repository, parent_id, item_id):
+    return {
+        'repository': repository,
+        'parent_ids': [parent_id],
+        'delete': True,
+        'item': {
+            'id': item_id
+        }
+    }
+
+
+class CascadeDelete:
+    """
+    Deletes every related item a page at a time, then the updates for the
+    item itself. Only a page is held in memory, and the state to resume
+    from is returned when the deadline passes or a page fails to write.
+    """
+    def __init__(self, *args, relations, updates) -> None:
+        self.args = args
+        self.relations = relations
+        self.updates = updates
+
+    def run(self, state=None, deadline=None):
+        step = 0
+        next_token = None
+        if state is not None:
+            step = state.get('step', None)
+            next_token = state.get('nextToken', None)
+            if not isinstance(step, int) or step < 0 or step > len(self.relations):
+                raise InvalidCascadeException(f'Invalid cascade step {step}.')
+        while step < len(self.relations):
+            relation = self.relations[step]
+            pages = PageIterator(
+                relation.repository,
+                *self.args,
+                *relation.parent_ids,
+                params=QueryParams(next_token=next_token),
+                projection=relation.projection)
+            for page in pages:
+                if past_deadline(deadline):
+                    return {'step': step, 'nextToken': next_token}
+                result = batch_write(*self.args, updates=[
+                    update for item in page.items for update in relation.deletes(item)
+                ])
+                if len(result.failures) > 0:
+                    return {'step': step, 'nextToken': next_token}
+                next_token = page.next_token
+            step += 1
+        if past_deadline(deadline):
+            return {'step': step, 'nextToken': None}
+        result = batch_write(*self.args, updates=self.updates)
+        if len(result.failures) > 0:
+            return {'step': step, 'nextToken': None}
+        return None
@@ -0,0 +1,135 @@
+import boto3
+import logging
+import os
+import threading
+from botocore.config import Config
+from time import perf_counter
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = Config(
+    max_pool_connections=int(os.getenv('MAX_POOL_CONNECTIONS', '25')),
+    tcp_keepalive=True,
+    retries={
+        'mode': 'adaptive',
+        'max_attempts': int(os.getenv('MAX_ATTEMPTS', '5')),
+    },
+)
+
+
+class DeferredClient:
+    """
+    Stands in for a boto3 client or resource until the first attribute
+    access, at which point the owning factory creates the real thing.
+    """
+    def __init__(self, factory, name, create, requires=()) -> None:
+        self._factory = factory
+        self._name = name
+        self._create = create
+        self._requires = requires
+
+    def __getattr__(self, name):
+        # Instances made without __init__, like copies, have no factory
+        if '_factory' not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self._factory.resolve(self), name)
+
+    def __repr__(self) -> str:
+        return f'DeferredClient({self._name})'
+
+
+class ClientFactory:
+    """
+    Creates boto3 clients and resources on first use from one shared
+    session, so service models are loaded once and every client shares
+    the same tuned configuration.
+    """
+    def __init__(self, session=None, config=DEFAULT_CONFIG) -> None:
+        self._session = session
+        self.config = config
+        self.instances = {}
+        self.timings = {}
+        self.deferred = {}
+        self.lock = threading.RLock()
+
+    def session(self):
+        with self.lock:
+            if self._session is None:
+                self._session = boto3.Session()
+            return self._session
+
+    def resolve(self, deferred):
+        return self.get(deferred._name, deferred._create, deferred._requires)
+
+    def get(self, name, create, requires=()):
+        instance = self.instances.get(name, None)
+        if instance is not None:
+            return instance
+        with self.lock:
+            if name not in self.instances:
+                # Dependencies are timed on their own
+                for required in requires:
+                    self.resolve(required)
+                start = perf_counter()
+                self.instances[name] = create(self.session())
+                self.timings[name] = perf_counter() - start
+                logger.debug(f'Created {name} in {self.timings[name]}s')
+            return self.instances[name]
+
+    def _defer(self, name, create, requires=()):
+        with self.lock:
+            if name not in self.deferred:
+                self.deferred[name] = DeferredClient(
+                    self, name, create, requires)
+            return self.deferred[name]
+
+    def _name(self, kind, service_name, kwargs, config):
+        # Keyed on the option values, Config objects never compare equal
+        options = [] if config is None else [
+            f'config.{k}={getattr(config, k)}'
+            for k, default in Config.OPTION_DEFAULTS.items()
+            if getattr(config, k) != default
+        ]
+        return ':'.join([kind, service_name] + [
+            f'{k}={v}' for k, v in sorted(kwargs.items())
+        ] + options)
+
+    def client(self, service_name, config=None, **kwargs):
+        name = self._name('client', service_name, kwargs, config)
+        config = self.config if config is None else self.config.merge(config)
+
+        def create(session):
+            return session.client(service_name, config=config, **kwargs)
+        return self._defer(name, create)
+
+    def resource(self, service_name, config=None, **kwargs):
+        name = self._name('resource', service_name, kwargs, config)
+        config = self.config if config is None else self.config.merge(config)
+
+        def create(session):
+            return session.resource(service_name, config=config, **kwargs)
+        return self._defer(name, create)
+
+    def table(self, table_name, **kwargs):
+        dynamodb = self.resource('dynamodb', **kwargs)
+
+        def create(session):
+            return dynamodb.Table(table_name)
+        return self._defer(f'table:{table_name}', create, (dynamodb,))
+
+    def warm(self):
+        """
+        Creates every client that has been requested but not yet used.
+        """
+        for deferred in list(self.deferred.values()):
+            self.resolve(deferred)
+
+    def reset(self):
+        """
+        Drops created clients and their connection pools. The session,
+        and the service models it has loaded, is kept.
+        """
+        with self.lock:
+            self.instances = {}
+            self.timings = {}
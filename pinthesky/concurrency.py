@@ -0,0 +1,48 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from time import monotonic, sleep
+
+
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', '8'))
+
+
+def submit(executor, fn, *args, **kwargs):
+    # Worker threads start with an empty context, which would hide the
+    # application context and the request being served.
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
+
+
+def map_concurrently(fn, items, max_workers=MAX_WORKERS):
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [fn(item) for item in items]
+    workers = min(max_workers, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [submit(executor, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def past_deadline(deadline):
+    return deadline is not None and monotonic() >= deadline
+
+
+class RateLimiter:
+    """
+    Spaces out calls shared across threads to at most rate per second.
+    """
+    def __init__(self, rate, clock=monotonic, sleep=sleep) -> None:
+        self.interval = 1 / rate if rate > 0 else 0
+        self.clock = clock
+        self.sleep = sleep
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = self.clock()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            self.sleep(wait)
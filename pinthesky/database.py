@@ -87,6 +87,13 @@ class DeviceToJobs(Repository):
         })
 
 
+class DeviceJobSummaries(Repository):
+    def __init__(self, table=None) -> None:
+        super().__init__(table=table, type="DeviceJobSummaries", fields_to_keys={
+            'jobId': 'SK'
+        })
+
+
 class Versions(Repository):
     def __init__(self, table=None) -> None:
         super().__init__(table=table, type="Versions", fields_to_keys={
@@ -0,0 +1,53 @@
+import logging
+from botocore.exceptions import ClientError
+from pinthesky.concurrency import map_concurrently
+
+
+THING_GROUP_PREFIX = 'pits-targets'
+
+logger = logging.getLogger(__name__)
+
+
+def thing_group_name(job_id):
+    """
+    Names the static thing group holding the targets of a single job.
+    A thing can only belong to 10 static groups, so the group is deleted
+    once the job is terminal.
+    """
+    return f'{THING_GROUP_PREFIX}-{job_id}'
+
+
+def ensure_thing_group(iot, group_name):
+    try:
+        return iot.describe_thing_group(thingGroupName=group_name)['thingGroupArn']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFoundException':
+            raise
+    try:
+        return iot.create_thing_group(thingGroupName=group_name)['thingGroupArn']
+    except ClientError as e:
+        # Another request created it in the meantime
+        if e.response['Error']['Code'] != 'ResourceAlreadyExistsException':
+            raise
+        return iot.describe_thing_group(thingGroupName=group_name)['thingGroupArn']
+
+
+def add_things_to_thing_group(iot, group_name, thing_names):
+    def add_thing(thing_name):
+        try:
+            iot.add_thing_to_thing_group(
+                thingGroupName=group_name,
+                thingName=thing_name)
+            return True
+        except ClientError as e:
+            logger.warning(f'Failed to add {thing_name} to {group_name}: {e}')
+            return False
+    return map_concurrently(add_thing, thing_names)
+
+
+def delete_thing_group(iot, group_name):
+    try:
+        iot.delete_thing_group(thingGroupName=group_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFoundException':
+            raise
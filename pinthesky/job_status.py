@@ -0,0 +1,184 @@
+import logging
+import os
+from botocore.exceptions import BotoCoreError, ClientError
+from ophis.database import MAX_ITEMS
+from pinthesky.batch import batch_write
+from pinthesky.cache import TTLCache
+from pinthesky.concurrency import map_concurrently, past_deadline
+from pinthesky.fleet import delete_thing_group
+
+
+TERMINAL_STATUSES = ['COMPLETED', 'CANCELED', 'DELETION_IN_PROGRESS']
+JOB_STATUS_TTL = int(os.getenv('JOB_STATUS_TTL', '15'))
+# IoT control plane calls share a small per account rate
+JOB_STATUS_WORKERS = int(os.getenv('JOB_STATUS_WORKERS', '4'))
+UNKNOWN_STATUS = 'unknown'
+# IoT reports DELETION_IN_PROGRESS until a deleted job is gone
+DELETED_STATUS = 'DELETION_IN_PROGRESS'
+# Large fleet jobs are created in IoT once their targets are populated
+POPULATING_STATUS = 'populating'
+JOB_FIELDS = [
+    'jobId',
+    'type',
+    'parameters',
+    'createTime',
+    'updateTime',
+    'status',
+    'description',
+]
+
+job_status_cache = TTLCache(ttl=JOB_STATUS_TTL)
+
+logger = logging.getLogger(__name__)
+
+
+def is_terminal(status):
+    return status in TERMINAL_STATUSES
+
+
+def persisted_status(job):
+    """
+    Returns the status stored on a job item once it was terminal, or None
+    when the status must come from IoT.
+    """
+    if is_terminal(job.get('status', None)) and 'description' in job:
+        return {
+            'status': job['status'],
+            'description': job['description']
+        }
+    if job.get('targetStatus', None) == 'populating':
+        return {'status': POPULATING_STATUS}
+    return None
+
+
+def _not_found(error):
+    return error.response['Error']['Code'] == 'ResourceNotFoundException'
+
+
+def fetch_status(iot, job):
+    """
+    Reads the status of a job from IoT. A job that IoT no longer knows
+    was deleted there, which is terminal.
+    """
+    try:
+        resp = iot.describe_job(jobId=job['jobId'])
+    except ClientError as e:
+        if not _not_found(e):
+            raise
+        return {
+            'status': DELETED_STATUS,
+            'description': job.get('description', '')
+        }
+    return {
+        'status': resp['job']['status'],
+        'description': resp['job'].get('description', '')
+    }
+
+
+def describe_status(iot, job, cache=job_status_cache):
+    status = cache.get(job['jobId'])
+    if status is None:
+        status = fetch_status(iot, job)
+        if not is_terminal(status['status']):
+            cache.put(job['jobId'], status)
+    return status
+
+
+def list_executions(iot, job_id, limiter=None):
+    kwargs = {'jobId': job_id, 'maxResults': MAX_ITEMS}
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            resp = iot.list_job_executions_for_job(**kwargs)
+        except ClientError as e:
+            # A deleted job has no executions left to list
+            if not _not_found(e):
+                raise
+            return
+        for summary in resp.get('executionSummaries', []):
+            yield summary
+        if resp.get('nextToken', None) is None:
+            break
+        kwargs['nextToken'] = resp['nextToken']
+
+
+def release_targets(iot, job):
+    """
+    Deletes the thing group of a large fleet job. It is called before the
+    terminal status is stored, so a failure is retried with the status.
+    """
+    if 'thingGroupName' in job:
+        delete_thing_group(iot, job['thingGroupName'])
+
+
+def persist_status(iot, job_data, camera_job_data, account_id, job, status, executions=None):
+    """
+    Stores a terminal status on every camera's copy of the job, then on
+    the job itself, which is left as is to retry when a copy fails.
+    Executions already listed for the job are reused.
+    """
+    if executions is None:
+        executions = list_executions(iot, job['jobId'])
+    camera_job = {key: value for key, value in {**job, **status}.items() if key in JOB_FIELDS}
+    result = batch_write(account_id, updates=[
+        {
+            'repository': camera_job_data,
+            'parent_ids': [thing_name],
+            'item': {
+                **camera_job,
+                'GS1-PK': camera_job_data.make_hash_key(account_id, thing_name)
+            }
+        }
+        for thing_name in dict.fromkeys(
+            summary['thingArn'].split('/')[-1] for summary in executions
+        )
+    ])
+    if len(result.failures) > 0:
+        logger.warning(f'Failed to persist status of {job["jobId"]} on {len(result.failures)} cameras')
+        return {**job, **status}
+    release_targets(iot, job)
+    return job_data.update(account_id, item={
+        'jobId': job['jobId'],
+        'updateTime': job['updateTime'],
+        **status
+    })
+
+
+def resolve_status(iot, job_data, camera_job_data, account_id, job, cache=job_status_cache):
+    """
+    Answers from the job item for terminal jobs, and otherwise from IoT,
+    persisting the status when IoT reports the job terminal.
+    """
+    status = persisted_status(job)
+    if status is None:
+        status = describe_status(iot, job, cache=cache)
+        if is_terminal(status['status']):
+            persist_status(iot, job_data, camera_job_data, account_id, job, status)
+    return status
+
+
+def resolve_statuses(
+        iot,
+        job_data,
+        camera_job_data,
+        account_id,
+        jobs,
+        deadline=None,
+        max_workers=JOB_STATUS_WORKERS):
+    """
+    Resolves the status of every job concurrently, falling back to an
+    unknown status when IoT throttles or the deadline has passed.
+    """
+    def resolve(job):
+        status = persisted_status(job)
+        if status is not None:
+            return status
+        if past_deadline(deadline):
+            return {'status': UNKNOWN_STATUS}
+        try:
+            return resolve_status(iot, job_data, camera_job_data, account_id, job)
+        except (BotoCoreError, ClientError) as e:
+            logger.warning(f'Failed to resolve status for {job["jobId"]}: {e}')
+            return {'status': UNKNOWN_STATUS}
+    return map_concurrently(resolve, jobs, max_workers=max_workers)
@@ -0,0 +1,59 @@
+import math
+from decimal import Decimal
+from pinthesky.cache import TTLCache
+from pinthesky.job_status import JOB_STATUS_TTL
+
+
+PERCENTILES = [50, 90, 99]
+
+job_summary_cache = TTLCache(ttl=JOB_STATUS_TTL)
+
+
+def percentile(values, pct):
+    """
+    Linearly interpolates the percentile of already sorted values.
+    """
+    if len(values) == 0:
+        return None
+    rank = (len(values) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize_executions(executions):
+    """
+    Counts executions by status and computes the distribution of how
+    long started executions have run, in milliseconds.
+    """
+    counts = {}
+    durations = []
+    total = 0
+    for execution in executions:
+        summary = execution['jobExecutionSummary']
+        total += 1
+        counts[summary['status']] = counts.get(summary['status'], 0) + 1
+        if 'startedAt' in summary and 'lastUpdatedAt' in summary:
+            delta = summary['lastUpdatedAt'] - summary['startedAt']
+            durations.append(max(0, round(delta.total_seconds() * 1000)))
+    durations.sort()
+    distribution = {'count': len(durations)}
+    if len(durations) > 0:
+        distribution['min'] = durations[0]
+        distribution['max'] = durations[-1]
+        distribution['mean'] = round(sum(durations) / len(durations))
+        for pct in PERCENTILES:
+            distribution[f'p{pct}'] = round(percentile(durations, pct))
+    return {
+        'total': total,
+        'counts': counts,
+        'durationMillis': distribution
+    }
+
+
+def restore_summary(value):
+    if isinstance(value, dict):
+        return {key: restore_summary(item) for key, item in value.items()}
+    if isinstance(value, Decimal):
+        return int(value)
+    return value
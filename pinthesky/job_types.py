@@ -0,0 +1,112 @@
+import json
+from string import Template
+
+
+DEFAULT_PARAMETERS = {'user': 'root'}
+
+
+class InvalidParametersException(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+class JobType:
+    """
+    A job document parsed, validated and split around its placeholders
+    once, so rendering is a single join over the pre-split chunks.
+    """
+    def __init__(self, name, template, defaults=DEFAULT_PARAMETERS) -> None:
+        self.name = name
+        self.template = template
+        self.defaults = defaults
+        self.literals = []
+        self.placeholders = []
+        literal = []
+        last = 0
+        for match in Template.pattern.finditer(template):
+            literal.append(template[last:match.start()])
+            last = match.end()
+            placeholder = match.group('named') or match.group('braced')
+            if match.group('escaped') is not None:
+                literal.append(Template.delimiter)
+            elif placeholder is None:
+                literal.append(match.group(0))
+            else:
+                self.literals.append(''.join(literal))
+                self.placeholders.append((placeholder, match.group(0)))
+                literal = []
+        literal.append(template[last:])
+        self.literals.append(''.join(literal))
+        self.parameters = [key for key in defaults.keys()]
+        for placeholder, _ in self.placeholders:
+            if placeholder not in self.parameters:
+                self.parameters.append(placeholder)
+        # Every placeholder must sit within a JSON string
+        document = json.loads(self.substitute({
+            name: name for name in self.parameters
+        }))
+        self.description = document['_comment']
+        self.version = document['version']
+
+    def substitute(self, parameters):
+        parts = [self.literals[0]]
+        for (placeholder, original), literal in zip(self.placeholders, self.literals[1:]):
+            value = parameters.get(placeholder, None)
+            if value is None:
+                parts.append(original)
+            else:
+                parts.append(json.dumps(str(value))[1:-1])
+            parts.append(literal)
+        return ''.join(parts)
+
+    def validate(self, parameters):
+        accepted = {}
+        for key, value in {**self.defaults, **parameters}.items():
+            if value is None or value == '':
+                continue
+            if key not in self.parameters:
+                raise InvalidParametersException(
+                    f'Parameter {key} is not valid for {self.name}. '
+                    f'Valid parameters: {self.parameters}')
+            if not isinstance(value, (str, int, float, bool)):
+                raise InvalidParametersException(
+                    f'Parameter {key} must be a string, number or boolean.')
+            accepted[key] = value
+        return accepted
+
+    def render(self, parameters):
+        accepted = self.validate(parameters)
+        return self.substitute(accepted), accepted
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'version': self.version,
+            'parameters': self.parameters
+        }
+
+
+class JobTypeRegistry:
+    def __init__(self, templates, defaults=DEFAULT_PARAMETERS) -> None:
+        self.job_types = {
+            name: JobType(name, template, defaults=defaults)
+            for name, template in templates.items()
+        }
+        self.listing = json.dumps({
+            'items': [job_type.describe() for job_type in self.job_types.values()],
+            'nextToken': None
+        })
+        self.descriptions = {
+            name: json.dumps(job_type.describe())
+            for name, job_type in self.job_types.items()
+        }
+
+    def __contains__(self, name):
+        return name in self.job_types
+
+    def __getitem__(self, name):
+        return self.job_types[name]
+
+    def names(self):
+        return list(self.job_types.keys())
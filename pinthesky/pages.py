@@ -0,0 +1,166 @@
+import os
+import threading
+from contextvars import copy_context
+from queue import Queue
+from boto3.dynamodb.conditions import And, Key
+from ophis.database import QueryParams, QueryResults
+
+
+READ_AHEAD = int(os.getenv('PAGE_READ_AHEAD', '1'))
+
+
+def query_page(
+        repository,
+        *args,
+        index_name=None,
+        params=QueryParams(),
+        projection=None,
+        filter_expression=None):
+    """
+    Queries a page like Repository.items and Repository.items_index, with
+    the same next tokens, optionally reading only the projected fields.
+    A filter expression drops items before they are returned, though
+    they still count against the page limit.
+    """
+    hash_key = repository.make_hash_key(*args)
+    header = ':'.join([repository.type, 'next_token'])
+    partition_key = 'PK'
+    q_params = {'ScanIndexForward': params.sort_ascending}
+    if index_name is not None:
+        q_params['IndexName'] = index_name
+        partition_key = f'{index_name}-PK'
+    key_cond = Key(partition_key).eq(hash_key)
+    for sort_filter in params.sort_filters:
+        sort_key = repository.fields_to_keys.get(sort_filter.name, sort_filter.name)
+        key_cond = And(key_cond, getattr(Key(sort_key), sort_filter.method)(*sort_filter.values))
+    q_params['KeyConditionExpression'] = key_cond
+    q_params['Limit'] = params.limit
+    if filter_expression is not None:
+        q_params['FilterExpression'] = filter_expression
+    if projection is not None:
+        names = {f'#p{index}': field for index, field in enumerate(projection)}
+        q_params['ProjectionExpression'] = ', '.join(names.keys())
+        q_params['ExpressionAttributeNames'] = names
+    last_key = repository.tokens.decrypt(
+        hash_key=hash_key,
+        header=header,
+        next_token=params.next_token)
+    if last_key is not None:
+        q_params['ExclusiveStartKey'] = last_key
+    resp = repository.table.query(**q_params)
+    return QueryResults(
+        items=[repository.prune_dto(item) for item in resp.get('Items', [])],
+        next_token=repository.tokens.encrypt(
+            hash_key=hash_key,
+            header=header,
+            last_key=resp.get('LastEvaluatedKey', None)))
+
+
+def valid_token(repository, *args, next_token):
+    """
+    Checks that a next token was issued for the query of the args, so a
+    tampered token is rejected before it reaches the query.
+    """
+    try:
+        repository.tokens.decrypt(
+            hash_key=repository.make_hash_key(*args),
+            header=':'.join([repository.type, 'next_token']),
+            next_token=next_token)
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def start_after(repository, *args, item):
+    """
+    Returns the next token of a query that resumes right after the item.
+    """
+    dto = repository.make_dto(*args, item=item, time_fields=[])
+    return repository.tokens.encrypt(
+        hash_key=dto['PK'],
+        header=':'.join([repository.type, 'next_token']),
+        last_key={'PK': dto['PK'], 'SK': dto['SK']})
+
+
+class PageIterator:
+    """
+    Iterates every page of a repository query, fetching up to read_ahead
+    pages on a background thread while the current page is consumed. The
+    thread starts only once the first page has a next token. Breaking out
+    of the iteration stops the fetching.
+    """
+    def __init__(
+            self,
+            repository,
+            *args,
+            index_name=None,
+            params=QueryParams(),
+            page_size=None,
+            read_ahead=READ_AHEAD,
+            projection=None,
+            filter_expression=None) -> None:
+        self.repository = repository
+        self.args = args
+        self.index_name = index_name
+        self.params = params if page_size is None else params._replace(limit=page_size)
+        self.read_ahead = read_ahead
+        self.projection = projection
+        self.filter_expression = filter_expression
+
+    def fetch(self, next_token):
+        return query_page(
+            self.repository,
+            *self.args,
+            index_name=self.index_name,
+            params=self.params._replace(next_token=next_token),
+            projection=self.projection,
+            filter_expression=self.filter_expression)
+
+    def __iter__(self):
+        page = self.fetch(self.params.next_token)
+        yield page
+        # Single page queries never pay for a background thread
+        if self.read_ahead <= 0:
+            while page.next_token is not None:
+                page = self.fetch(page.next_token)
+                yield page
+            return
+        if page.next_token is None:
+            return
+        start_token = page.next_token
+        pages = Queue(maxsize=self.read_ahead)
+        stopped = threading.Event()
+
+        def produce():
+            next_token = start_token
+            while not stopped.is_set():
+                try:
+                    page = self.fetch(next_token)
+                except Exception as e:
+                    pages.put((None, e))
+                    break
+                pages.put((page, None))
+                if page.next_token is None:
+                    break
+                next_token = page.next_token
+
+        # The producer needs the application context of the request
+        threading.Thread(target=copy_context().run, args=(produce,), daemon=True).start()
+        try:
+            while True:
+                page, error = pages.get()
+                if error is not None:
+                    raise error
+                yield page
+                if page.next_token is None:
+                    break
+        finally:
+            stopped.set()
+            # Unblocks a producer waiting on a full queue
+            while not pages.empty():
+                pages.get_nowait()
+
+    def items(self):
+        for page in self:
+            for item in page.items:
+                yield item
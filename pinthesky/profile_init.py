@@ -0,0 +1,185 @@
+"""
+Profiles the cold start of the Lambda entry point:
+
+    python -m pinthesky.profile_init > init.json
+
+A child interpreter imports pinthesky.resource under -X importtime,
+creates the AWS clients the resources asked for and reports its peak
+RSS. Import times are aggregated by the pinthesky subsystem that caused
+them, and everything is emitted as JSON to track regressions.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+CHILD = "from pinthesky.profile_init import child; child({route!r}, {clients!r})"
+STARTUP = '(startup)'
+
+
+def _peak_rss_bytes():
+    from resource import getrusage, RUSAGE_SELF
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def child(route=None, create_clients=True):
+    start = time.perf_counter()
+    import pinthesky.resource as resource
+    if route is None:
+        resource.load_all_resources()
+    else:
+        resource.load_resources_for_path(route)
+    init_seconds = time.perf_counter() - start
+    clients = resource.loaded_resources['inject'].clients
+    if create_clients:
+        clients.warm()
+    print(json.dumps({
+        'initSeconds': init_seconds,
+        'resources': sorted(resource.loaded_resources.keys()),
+        'clients': dict(clients.timings),
+        'peakRssBytes': _peak_rss_bytes(),
+    }))
+
+
+def subsystem_of(module):
+    parts = module.split('.')
+    if parts[0] != 'pinthesky':
+        return None
+    if len(parts) == 1:
+        return 'pinthesky'
+    if parts[1] == 'resource' and len(parts) > 2:
+        return '.'.join(parts[1:3])
+    return parts[1]
+
+
+def parse_importtime(lines):
+    """
+    Converts -X importtime output into (module, depth, self_us) rows,
+    ordered parents first.
+    """
+    rows = []
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((name.strip(), depth, int(self_us)))
+    # importtime prints children before their parents
+    rows.reverse()
+    return rows
+
+
+def aggregate_imports(rows, slowest=15):
+    subsystems = {}
+    packages = {}
+    stack = []
+    for module, depth, self_us in rows:
+        del stack[depth:]
+        stack.append(module)
+        owner = STARTUP
+        for ancestor in reversed(stack):
+            system = subsystem_of(ancestor)
+            if system is not None:
+                owner = system
+                break
+        entry = subsystems.setdefault(owner, {'micros': 0, 'modules': 0})
+        entry['micros'] += self_us
+        entry['modules'] += 1
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    ranked = sorted(rows, key=lambda row: row[2], reverse=True)
+    return {
+        'subsystems': {
+            name: {'seconds': entry['micros'] / 1e6, 'modules': entry['modules']}
+            for name, entry in sorted(
+                subsystems.items(),
+                key=lambda item: item[1]['micros'],
+                reverse=True)
+        },
+        'packages': {
+            name: micros / 1e6
+            for name, micros in sorted(
+                packages.items(),
+                key=lambda item: item[1],
+                reverse=True)
+        },
+        'slowest': [
+            {'module': module, 'seconds': self_us / 1e6}
+            for module, _, self_us in ranked[:slowest]
+        ],
+    }
+
+
+def profile(route=None, create_clients=True):
+    env = {**os.environ}
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [
+            sys.executable,
+            '-X', 'importtime',
+            '-c', CHILD.format(route=route, clients=create_clients),
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True)
+    wall_seconds = time.perf_counter() - start
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = aggregate_imports(parse_importtime(proc.stderr.splitlines()))
+    return {
+        'python': platform.python_version(),
+        'resourceLoading': env.get('RESOURCE_LOADING', 'eager'),
+        'route': route,
+        'wallSeconds': wall_seconds,
+        'initSeconds': report['initSeconds'],
+        'resources': report['resources'],
+        'clientSeconds': sum(report['clients'].values()),
+        'clients': report['clients'],
+        'peakRssBytes': report['peakRssBytes'],
+        **imports,
+    }
+
+
+def _create_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        "pinthesky.profile_init",
+        description="reports import, client and memory cost of a cold start"
+    )
+    parser.add_argument(
+        "--route",
+        default=None,
+        help="only load resources serving this path, ie: /jobTypes"
+    )
+    parser.add_argument(
+        "--skip-clients",
+        action="store_true",
+        help="do not create the AWS clients requested by the resources"
+    )
+    parser.add_argument(
+        "--slowest",
+        type=int,
+        default=15,
+        help="number of slowest modules to report (default: 15)"
+    )
+    return parser
+
+
+def main():
+    args = _create_parser().parse_args(sys.argv[1:])
+    report = profile(route=args.route, create_clients=not args.skip_clients)
+    report['slowest'] = report['slowest'][:args.slowest]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
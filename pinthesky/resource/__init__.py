@@ -1,25 +1,72 @@
-from pinthesky import api, set_stream_logger
+import logging
+import os
+import sys
+from pinthesky import api, set_stream_logger, snapstart
 from ophis.globals import request, response
-from pinthesky.resource import inject, iot, cameras, groups, jobs, jobTypes, subscriptions, videos, tags, stats, storage, versions, tokens, connections
-
-
-for res in [
-    cameras,
-    inject,
-    iot,
-    groups,
-    jobs,
-    jobTypes,
-    videos,
-    subscriptions,
-    tags,
-    stats,
-    storage,
-    versions,
-    tokens,
-    connections,
-]:
-    set_stream_logger(res.__name__)
+
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_LOADING = os.getenv('RESOURCE_LOADING', 'eager')
+
+# Maps the first segment of a route to the resource module serving it,
+# along with the modules that inject the names its handlers depend on.
+RESOURCE_MANIFEST = {
+    '/cameras': [
+        'iot',
+        'storage',
+        'groups',
+        'stats',
+        'tags',
+        'videos',
+        'jobs',
+        'cameras',
+    ],
+    '/connections': ['connections'],
+    '/groups': ['iot', 'storage', 'cameras', 'groups'],
+    '/iot': ['iot'],
+    '/jobs': ['iot', 'groups', 'jobs'],
+    '/jobTypes': ['jobTypes'],
+    '/stats': ['stats'],
+    '/storage': ['storage'],
+    '/subscriptions': ['subscriptions'],
+    '/tags': ['storage', 'tags'],
+    '/tokens': ['tokens'],
+    '/versions': ['versions'],
+    '/videos': ['storage', 'tags', 'videos'],
+}
+
+loaded_resources = {}
+
+
+def load_resource(name):
+    if name not in loaded_resources:
+        # The builtin import is visible to -X importtime, unlike importlib
+        module_name = f'{__name__}.{name}'
+        __import__(module_name)
+        module = sys.modules[module_name]
+        set_stream_logger(module.__name__)
+        loaded_resources[name] = module
+    return loaded_resources[name]
+
+
+def load_resources_for_path(path):
+    prefix = '/' + path.lstrip('/').split('/', 1)[0]
+    for name in RESOURCE_MANIFEST.get(prefix, []):
+        load_resource(name)
+
+
+def load_all_resources():
+    for names in RESOURCE_MANIFEST.values():
+        for name in names:
+            load_resource(name)
+
+
+# Shared configuration is always loaded, so the application context
+# is hydrated before any request is routed.
+load_resource('inject')
+if RESOURCE_LOADING != 'lazy':
+    load_all_resources()
 
 
 @api.filter()
@@ -35,3 +82,12 @@ def cors():
     }
     if request.method() == 'OPTIONS':
         response.break_continuation()
+
+
+if RESOURCE_LOADING == 'lazy':
+    @api.filter()
+    def lazy_resources():
+        load_resources_for_path(request.request_context('http')['path'])
+
+
+snapstart.register()
@@ -1,57 +1,114 @@
 import json
 import re
+from functools import partial
+from itertools import chain
 from uuid import uuid4
 from botocore.exceptions import ClientError
 from pinthesky import api
-from pinthesky.conversion import timestamp_to_motion
+from pinthesky.batch import batch_get, batch_write
+from pinthesky.cache import TTLCache
+from pinthesky.captures import MAX_TARGETS, capture_image_event, capture_video_event
+from pinthesky.captures import health_event, lookup_thumbnail, lookup_thumbnails, publish_event, publish_events
+from pinthesky.captures import unique_targets
+from pinthesky.captures import thumbnail_key
+from pinthesky.cascade import CascadeDelete, Relation, edge_delete
+from pinthesky.concurrency import map_concurrently, past_deadline
+from pinthesky.conversion import hashed_video, sort_filters_for, timestamp_to_motion
 from pinthesky.database import Cameras, CamerasToGroups
-from ophis.database import ConflictException, Repository, QueryParams
+from pinthesky.pages import PageIterator, valid_token
+from ophis.database import ConflictException, QueryParams
 from ophis.globals import app_context, request, response
-from pinthesky.resource.helpers import create_query_params, get_limit
-from pinthesky.s3 import generate_presigned_url
+from pinthesky.resource.helpers import all_items, create_query_params, delete_cascade, get_expansions, read_items
+from pinthesky.resource.helpers import decode_token, encode_token, get_deadline, include_statuses, write_updates
+from pinthesky.s3 import MAX_DELETE_KEYS, delete_objects, generate_presigned_url, sign_videos, video_key
+from pinthesky.shadows import SHADOW_CACHE_TTL, desired_state, get_shadow, update_shadow
 
 
-LATEST_THUMBNAIL = "thumbnail_latest.jpg"
-DEFAULT_VIDEO_DURATION = 30
+CAMERA_EXPANSIONS = ['latestStats', 'groups']
 
 
 app_context.inject('camera_data', Cameras())
 app_context.inject('camera_group_data', CamerasToGroups())
+app_context.inject('shadow_cache', TTLCache(ttl=SHADOW_CACHE_TTL))
 
 
-def publish_event(iot_data, thing_name, payload):
-    return iot_data.publish(
-        topic=f'pinthesky/events/{thing_name}/input',
-        payload=bytes(json.dumps(payload), encoding="utf8"))
+def _expand_cameras(
+        cameras,
+        expansions,
+        camera_group_data,
+        group_data,
+        stats_data):
+    if 'latestStats' in expansions:
+        stats = batch_get(
+            request.account_id(),
+            'latest',
+            reads=[
+                {'id': camera['thingName'], 'repository': stats_data}
+                for camera in cameras
+            ]
+        )
+        for camera, latest in zip(cameras, stats):
+            camera['latestStats'] = latest
+    if 'groups' in expansions:
+        def list_group_names(camera):
+            return [
+                item['id'] for item in all_items(
+                    camera_group_data,
+                    request.account_id(),
+                    camera['thingName'],
+                    projection=['id'])
+            ]
+        camera_groups = map_concurrently(list_group_names, cameras)
+        group_names = list(dict.fromkeys(
+            group_name for names in camera_groups for group_name in names
+        ))
+        groups = dict(zip(group_names, batch_get(
+            request.account_id(),
+            reads=[
+                {'id': group_name, 'repository': group_data}
+                for group_name in group_names
+            ]
+        )))
+        for camera, names in zip(cameras, camera_groups):
+            camera['groups'] = [
+                groups[name] for name in names if groups[name] is not None
+            ]
+    return cameras
 
 
 @api.route("/cameras")
-def list_cameras(camera_data):
+def list_cameras(camera_data, camera_group_data, group_data, stats_data):
+    expansions, invalid = get_expansions(request, CAMERA_EXPANSIONS)
+    if len(invalid) > 0:
+        response.status_code = 400
+        return {
+            'message': f'Invalid expand {invalid}. Valid: {CAMERA_EXPANSIONS}'
+        }
+
+    def expand(cameras):
+        return _expand_cameras(
+            cameras,
+            expansions,
+            camera_group_data=camera_group_data,
+            group_data=group_data,
+            stats_data=stats_data)
     thing_names = request.queryparams.get('thingName', None)
     if thing_names is None:
         page = camera_data.items(
             request.account_id(),
             params=create_query_params(request))
         return {
-            'items': page.items,
+            'items': expand(page.items),
             'nextToken': page.next_token
         }
-    item_ids = re.split('\\s*,\\s*', thing_names)
-    limit = get_limit(request)
-    if len(item_ids) > limit:
-        response.status_code = 400
-        return {
-            'message': f'Provided {len(item_ids)} is more than {limit}.'
-        }
-    return {
-        'items': Repository.batch_read(
-            request.account_id(),
-            reads=[
-                {'id': item_id, 'repository': camera_data}
-                for item_id in item_ids
-            ]
-        )
-    }
+    found = read_items(
+        request,
+        response,
+        camera_data,
+        re.split('\\s*,\\s*', thing_names))
+    if 'items' in found:
+        found['items'] = expand(found['items'])
+    return found
 
 
 @api.route("/cameras/:thing_name")
@@ -79,7 +136,12 @@ def list_camera_groups(camera_group_data, thing_name):
 
 
 @api.route('/cameras/:thing_name/videos')
-def list_camera_videos(motion_videos_data, thing_name):
+def list_camera_videos(
+        motion_videos_data,
+        s3,
+        bucket_name,
+        video_prefix,
+        thing_name):
     page = motion_videos_data.items(
         request.account_id(),
         thing_name,
@@ -88,12 +150,167 @@ def list_camera_videos(motion_videos_data, thing_name):
             sort_order="descending",
             sort_field="motionVideo",
             format=timestamp_to_motion))
+    if request.queryparams.get('includeUrls', 'false') == 'true':
+        sign_videos(s3, bucket_name, video_prefix, page.items)
     return {
         'items': page.items,
         'nextToken': page.next_token
     }
 
 
+def _purge_videos(
+        motion_videos_data,
+        video_tag_data,
+        tag_video_data,
+        s3,
+        bucket_name,
+        video_prefix,
+        thing_name,
+        videos):
+    """
+    Deletes the objects of a page of videos, then their tag edges, then
+    their metadata, so a video is only forgotten once its object and
+    edges are gone. Failed videos are listed again on a retry.
+    """
+    keys = {
+        video_key(video_prefix, thing_name, video['motionVideo']): video
+        for video in videos
+    }
+    failures = [
+        {
+            'motionVideo': keys[error['Key']]['motionVideo'],
+            'message': error.get('Message', error.get('Code', ''))
+        }
+        for error in delete_objects(s3, bucket_name, list(keys.keys()))
+    ]
+    failed = set(failure['motionVideo'] for failure in failures)
+    videos = [video for video in videos if video['motionVideo'] not in failed]
+
+    def list_tag_names(video):
+        return [
+            item['id'] for item in all_items(
+                video_tag_data,
+                request.account_id(),
+                hashed_video(video['motionVideo'], thing_name),
+                projection=['id'])
+        ]
+    edges = []
+    for video, tag_names in zip(videos, map_concurrently(list_tag_names, videos)):
+        gen_id = hashed_video(video['motionVideo'], thing_name)
+        for tag_name in tag_names:
+            edges.append((video, edge_delete(tag_video_data, tag_name, gen_id)))
+            edges.append((video, edge_delete(video_tag_data, gen_id, tag_name)))
+    result = batch_write(request.account_id(), updates=[update for _, update in edges])
+    failed_edges = set(id(update) for update in result.failures)
+    tagged = set(
+        video['motionVideo'] for video, update in edges
+        if id(update) in failed_edges
+    )
+    for motion_video in tagged:
+        failures.append({
+            'motionVideo': motion_video,
+            'message': 'Failed to delete the video tags.'
+        })
+    videos = [video for video in videos if video['motionVideo'] not in tagged]
+    result = batch_write(request.account_id(), updates=[
+        {
+            'repository': motion_videos_data,
+            'parent_ids': [thing_name],
+            'delete': True,
+            'item': {
+                'motionVideo': video['motionVideo']
+            }
+        }
+        for video in videos
+    ])
+    failures.extend(
+        {
+            'motionVideo': update['item']['motionVideo'],
+            'message': 'Failed to delete the video metadata.'
+        }
+        for update in result.failures
+    )
+    return len(videos) - len(result.failures), failures
+
+
+@api.route('/cameras/:thing_name/videos', methods=['DELETE'])
+def delete_camera_videos(
+        motion_videos_data,
+        video_tag_data,
+        tag_video_data,
+        s3,
+        bucket_name,
+        video_prefix,
+        thing_name):
+    start_time = request.queryparams.get('startTime', None)
+    end_time = request.queryparams.get('endTime', None)
+    if start_time is None or end_time is None:
+        response.status_code = 400
+        return {
+            'message': 'Deleting videos requires a startTime and endTime.'
+        }
+    state = {'startTime': start_time, 'endTime': end_time}
+    if 'nextToken' in request.queryparams:
+        state = decode_token(request.queryparams['nextToken'])
+        if not isinstance(state, dict) or not valid_token(
+                motion_videos_data,
+                request.account_id(),
+                thing_name,
+                next_token=state.get('nextToken', None)):
+            response.status_code = 400
+            return {
+                'message': f'Invalid nextToken {request.queryparams["nextToken"]}.'
+            }
+        # The token resumes the range it was issued for
+        if state.get('startTime', None) != start_time or state.get('endTime', None) != end_time:
+            response.status_code = 400
+            return {
+                'message': 'The nextToken was issued for a different startTime and endTime.'
+            }
+    sort_filters = sort_filters_for(
+        field='motionVideo',
+        start_time=start_time,
+        end_time=end_time,
+        format=timestamp_to_motion)
+    deadline = get_deadline(request)
+    next_token = state.get('nextToken', None)
+    deleted = 0
+    failures = []
+    pages = PageIterator(
+        motion_videos_data,
+        request.account_id(),
+        thing_name,
+        params=QueryParams(next_token=next_token, sort_filters=sort_filters),
+        page_size=MAX_DELETE_KEYS,
+        projection=['motionVideo'])
+    for page in pages:
+        if past_deadline(deadline):
+            break
+        purged, failed = _purge_videos(
+            motion_videos_data,
+            video_tag_data,
+            tag_video_data,
+            s3,
+            bucket_name,
+            video_prefix,
+            thing_name,
+            page.items)
+        deleted += purged
+        failures.extend(failed)
+        next_token = page.next_token
+        if next_token is None:
+            return {
+                'deleted': deleted,
+                'failures': failures
+            }
+    response.status_code = 202
+    return {
+        'deleted': deleted,
+        'failures': failures,
+        'nextToken': encode_token({**state, 'nextToken': next_token})
+    }
+
+
 @api.route('/cameras/:thing_name/stats')
 def list_device_health_history(stats_data, thing_name):
     page = stats_data.items(
@@ -112,16 +329,59 @@ def list_device_health_history(stats_data, thing_name):
     }
 
 
+def _request_body():
+    return json.loads(request.body) if request.body != "" else {}
+
+
+def _publish_bulk(iot_data, group_camera_data, body, create_event):
+    thing_names = body.get('thingNames', [])
+    if not isinstance(thing_names, list) or not all(isinstance(name, str) for name in thing_names):
+        response.status_code = 400
+        return {
+            'message': 'thingNames must be a list of thing names.'
+        }
+    if 'groupName' in body:
+        thing_names = chain(thing_names, (item['id'] for item in all_items(
+            group_camera_data,
+            request.account_id(),
+            body['groupName'],
+            projection=['id'])))
+    targets = unique_targets(thing_names)
+    if targets is None:
+        response.status_code = 400
+        return {
+            'message': f'At most {MAX_TARGETS} cameras can be targeted at once.'
+        }
+    if len(targets) == 0:
+        response.status_code = 400
+        return {
+            'message': 'Either thingNames or groupName must be provided.'
+        }
+    return {
+        'items': publish_events(iot_data, targets, create_event)
+    }
+
+
+@api.route("/cameras/captureImage", methods=["POST"])
+def start_bulk_capture_image(iot_data, group_camera_data):
+    return _publish_bulk(iot_data, group_camera_data, _request_body(), capture_image_event)
+
+
+@api.route("/cameras/captureVideo", methods=["POST"])
+def start_bulk_capture_video(iot_data, group_camera_data):
+    body = _request_body()
+    return _publish_bulk(iot_data, group_camera_data, body, partial(capture_video_event, body=body))
+
+
+@api.route("/cameras/stats", methods=["POST"])
+def start_bulk_camera_health(iot_data, group_camera_data):
+    return _publish_bulk(iot_data, group_camera_data, _request_body(), health_event)
+
+
 @api.route("/cameras/:thing_name/captureImage", methods=["POST"])
 def start_capture_image(iot_data, thing_name):
     capture_id = str(uuid4())
-    publish_event(iot_data, thing_name, {
-        "name": "capture_image",
-        "context": {
-            "file_name": LATEST_THUMBNAIL,
-            "capture_id": capture_id
-        }
-    })
+    publish_event(iot_data, thing_name, capture_image_event(capture_id))
     return {
         "id": capture_id
     }
@@ -130,57 +390,67 @@ def start_capture_image(iot_data, thing_name):
 @api.route("/cameras/:thing_name/captureVideo", methods=["POST"])
 def start_capture_video(iot_data, thing_name):
     capture_id = str(uuid4())
-    body = json.loads(request.body) if request.body != "" else {}
-    # When requested, we will default to a 30 second buffer.
-    duration = DEFAULT_VIDEO_DURATION
-    if "durationInSeconds" in body:
-        duration = body['durationInSeconds']
-    publish_event(iot_data, thing_name, {
-        "name": "capture_video",
-        "context": {
-            "capture_id": capture_id,
-            "duration": duration,
-        }
-    })
+    publish_event(iot_data, thing_name, capture_video_event(capture_id, _request_body()))
     return {
         "id": capture_id
     }
 
 
+# Static segments are matched before parameters, so this route hides
+# GET /cameras/:thing_name for a camera named captureImage.
+@api.route("/cameras/captureImage")
+def list_captured_images(s3, bucket_name, image_prefix, group_camera_data):
+    thing_names = []
+    if 'thingName' in request.queryparams:
+        thing_names = re.split('\\s*,\\s*', request.queryparams['thingName'])
+    if 'groupName' in request.queryparams:
+        thing_names.extend(item['id'] for item in all_items(
+            group_camera_data,
+            request.account_id(),
+            request.queryparams['groupName'],
+            projection=['id']))
+    if len(thing_names) == 0:
+        response.status_code = 400
+        return {
+            'message': 'Either thingName or groupName must be provided.'
+        }
+    return {
+        'items': lookup_thumbnails(
+            s3,
+            bucket_name,
+            image_prefix,
+            thing_names,
+            include_url=request.queryparams.get('includeUrl', 'false') == 'true')
+    }
+
+
 @api.route("/cameras/:thing_name/captureImage")
 def get_captured_image(s3, bucket_name, image_prefix, thing_name):
-    s3key = f'{image_prefix}/{thing_name}/{LATEST_THUMBNAIL}'
-    try:
-        resp = s3.head_object(Bucket=bucket_name, Key=s3key)
+    thumbnail = lookup_thumbnail(s3, bucket_name, image_prefix, thing_name)
+    if thumbnail is None:
+        response.status_code = 404
         return {
-            "id": s3key,
-            "contentType": resp['ContentType'],
-            "contentLength": resp['ContentLength'],
-            "lastModified": resp['LastModified'].isoformat()
+            "message": "capture image is not available"
         }
-    except ClientError as e:
-        if e.response['Error']['Code'] == '404':
-            response.status_code = 404
-            return {
-                "message": "capture image is not available"
-            }
-        else:
-            raise
+    return thumbnail
 
 
 @api.route("/cameras/:thing_name/captureImage/url")
 def get_captured_image_url(s3, bucket_name, image_prefix, thing_name):
-    s3key = f'{image_prefix}/{thing_name}/{LATEST_THUMBNAIL}'
+    s3key = thumbnail_key(image_prefix, thing_name)
     return generate_presigned_url(s3, bucket_name, s3key)
 
 
 @api.route("/cameras/:thing_name/configuration")
-def get_camera_configuration(iot_data, thing_name):
+def get_camera_configuration(iot_data, shadow_cache, thing_name):
     try:
-        thing_resp = iot_data.get_thing_shadow(
-            thingName=thing_name,
-            shadowName="pinthesky")
-        payload = json.loads(thing_resp['payload'].read())
+        payload, hit = get_shadow(
+            iot_data,
+            shadow_cache,
+            request.account_id(),
+            thing_name,
+            consistent=request.queryparams.get('consistent', 'false') == 'true')
+        response.headers['x-cache'] = 'hit' if hit else 'miss'
         state_param = request.queryparams.get('state', None)
         document_param = request.queryparams.get('document', None)
         if document_param is None:
@@ -217,31 +487,15 @@ def get_camera_configuration(iot_data, thing_name):
 
 
 @api.route("/cameras/:thing_name/configuration", methods=["POST"])
-def update_camera_configuration(iot_data, thing_name):
+def update_camera_configuration(iot_data, shadow_cache, thing_name):
     try:
-        configuration = json.loads(request.body)
-        payload = {
-            'state': {
-                'desired': {
-                }
-            }
-        }
-        # In order to be backwards compatible, if the payload
-        # received does not contain a "camera" field, then we
-        # assume that the configuration only applies to the camera
-        # document. Otherwise we will update any subdocument
-        # that targets the thing.
-        keys = []
-        if 'camera' not in configuration:
-            payload['state']['desired']['camera'] = configuration
-        else:
-            keys = list(configuration.keys())
-            payload['state']['desired'].update(configuration)
-        thing_resp = iot_data.update_thing_shadow(
-            thingName=thing_name,
-            shadowName="pinthesky",
-            payload=bytes(json.dumps(payload), encoding="utf8"))
-        r_payload = json.loads(thing_resp['payload'].read())
+        desired, keys = desired_state(json.loads(request.body))
+        r_payload = update_shadow(
+            iot_data,
+            shadow_cache,
+            request.account_id(),
+            thing_name,
+            desired)
         if len(keys) == 0:
             return r_payload['state']['desired']['camera']
         rval = {}
@@ -261,12 +515,7 @@ def update_camera_configuration(iot_data, thing_name):
 def start_camera_health(iot_data, thing_name):
     health_id = str(uuid4())
     # TODO: we can match this entry so it shows as pending on the console
-    publish_event(iot_data, thing_name, {
-        "name": "health",
-        "context": {
-            "health_id": health_id
-        }
-    })
+    publish_event(iot_data, thing_name, health_event(health_id))
     return {
         "id": health_id
     }
@@ -284,7 +533,12 @@ def get_health_entry(stats_data, thing_name, timestamp):
 
 
 @api.route('/cameras/:thing_name/jobs')
-def list_jobs_for_camera(camera_job_data, thing_name, first_index):
+def list_jobs_for_camera(
+        camera_job_data,
+        job_data,
+        iot,
+        thing_name,
+        first_index):
     page = camera_job_data.items_index(
         request.account_id(),
         thing_name,
@@ -295,7 +549,7 @@ def list_jobs_for_camera(camera_job_data, thing_name, first_index):
         )
     )
     return {
-        'items': page.items,
+        'items': include_statuses(request, iot, job_data, camera_job_data, page.items),
         'next_token': page.next_token
     }
 
@@ -319,7 +573,7 @@ def create_camera_groups(camera_group_data, group_camera_data, thing_name):
                 'id': thing_name
             }
         })
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
 
 
 @api.route("/cameras/:thing_name/groups/:group_name", methods=['DELETE'])
@@ -345,7 +599,7 @@ def delete_camera_group(
         },
         'delete': True
     })
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
 
 
 @api.route("/cameras", methods=['POST'])
@@ -379,40 +633,21 @@ def delete_camera(
         camera_group_data,
         group_camera_data,
         thing_name):
-    truncated = True
-    next_token = None
-    updates = [{
-        'repository': camera_data,
-        'item': {
-            'thingName': thing_name
-        },
-        'delete': True
-    }]
-    while truncated:
-        page = camera_group_data.items(
-            request.account_id(),
-            thing_name,
-            params=QueryParams(next_token=next_token))
-        for item in page.items:
-            updates.append({
-                'repository': camera_group_data,
-                'parent_ids': [thing_name],
-                'item': {
-                    'id': item['id']
-                },
-                'delete': True
-            })
-            updates.append({
-                'repository': group_camera_data,
-                'parent_ids': [item['id']],
-                'item': {
-                    'id': thing_name
-                },
-                'delete': True
-            })
-        next_token = page.next_token
-        truncated = next_token is not None
-    Repository.batch_write(request.account_id(), updates=updates)
+    return delete_cascade(request, response, CascadeDelete(
+        request.account_id(),
+        relations=[
+            Relation(camera_group_data, [thing_name], lambda item: [
+                edge_delete(camera_group_data, thing_name, item['id']),
+                edge_delete(group_camera_data, item['id'], thing_name),
+            ], projection=['id'])
+        ],
+        updates=[{
+            'repository': camera_data,
+            'item': {
+                'thingName': thing_name
+            },
+            'delete': True
+        }]))
 
 
 @api.route("/cameras/:thing_name", methods=['PUT'])
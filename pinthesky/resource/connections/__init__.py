@@ -1,4 +1,3 @@
-import boto3
 import logging
 from botocore.exceptions import ClientError
 from ophis.globals import app_context, request, response
@@ -42,12 +41,12 @@ def get_connection(connectionId, connections):
 
 
 @api.route('/connections/:connectionId', methods=['DELETE'])
-def delete_connection(connectionId, connections):
+def delete_connection(connectionId, connections, clients):
     resp = get_connection(connectionId, connections)
     if response.status_code == 404:
         response.status_code = 204
         return
-    management = boto3.client(
+    management = clients.client(
         'apigatewaymanagementapi',
         endpoint_url=resp['managementEndpoint'])
     try:
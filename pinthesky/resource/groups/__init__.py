@@ -1,22 +1,51 @@
 import json
 import re
+from functools import partial
+from botocore.exceptions import BotoCoreError, ClientError
 from pinthesky import api
+from pinthesky.batch import batch_get
+from pinthesky.captures import MAX_TARGETS, capture_image_event, capture_video_event, health_event
+from pinthesky.captures import lookup_thumbnails, publish_events, unique_targets
+from pinthesky.cascade import CascadeDelete, Relation, edge_delete
+from pinthesky.concurrency import map_concurrently, past_deadline
 from pinthesky.database import Groups, GroupsToCameras
-from ophis.database import ConflictException, QueryParams, Repository
+from pinthesky.pages import PageIterator
+from ophis.database import ConflictException, QueryParams
 from ophis.globals import app_context, request, response
-from pinthesky.resource.helpers import create_query_params, get_limit
+from pinthesky.resource.helpers import all_items, create_query_params, decode_token, delete_cascade, encode_token
+from pinthesky.resource.helpers import get_deadline, write_updates
+from pinthesky.resource.helpers import get_expansions, read_items
+from pinthesky.shadows import desired_state, update_shadow
 
 
 app_context.inject('group_data', Groups())
 app_context.inject('group_camera_data', GroupsToCameras())
 
+GROUP_CAMERA_EXPANSIONS = ['camera']
+
 
 @api.route("/groups/:group_name/cameras")
-def list_group_cameras(group_camera_data, group_name):
+def list_group_cameras(group_camera_data, camera_data, group_name):
+    expansions, invalid = get_expansions(request, GROUP_CAMERA_EXPANSIONS)
+    if len(invalid) > 0:
+        response.status_code = 400
+        return {
+            'message': f'Invalid expand {invalid}. Valid: {GROUP_CAMERA_EXPANSIONS}'
+        }
     page = group_camera_data.items(
         request.account_id(),
         group_name,
         params=create_query_params(request))
+    if 'camera' in expansions:
+        cameras = batch_get(
+            request.account_id(),
+            reads=[
+                {'id': item['id'], 'repository': camera_data}
+                for item in page.items
+            ]
+        )
+        for item, camera in zip(page.items, cameras):
+            item['camera'] = camera
     return {
         'items': page.items,
         'nextToken': page.next_token
@@ -42,7 +71,142 @@ def create_group_cameras(camera_group_data, group_camera_data, group_name):
                 'id': group_name
             }
         })
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
+
+
+@api.route("/groups/:group_name/configuration", methods=['POST'])
+def update_group_configuration(
+        group_camera_data,
+        iot_data,
+        shadow_cache,
+        group_name):
+    desired, _ = desired_state(json.loads(request.body))
+    cameras = []
+    page_token = None
+    next_token = request.queryparams.get('nextToken', None)
+    if next_token is not None:
+        token = decode_token(next_token)
+        if not isinstance(token, dict):
+            response.status_code = 400
+            return {
+                'message': f'Invalid nextToken {next_token}.'
+            }
+        cameras = token.get('cameras', [])
+        page_token = token.get('nextToken', None)
+    more = next_token is None or token.get('more', False)
+    account_id = request.account_id()
+    deadline = get_deadline(request)
+
+    def update_camera(thing_name):
+        if past_deadline(deadline):
+            return None
+        try:
+            update_shadow(iot_data, shadow_cache, account_id, thing_name, desired)
+            return {
+                'thingName': thing_name,
+                'status': 'succeeded'
+            }
+        except (BotoCoreError, ClientError) as e:
+            return {
+                'thingName': thing_name,
+                'status': 'failed',
+                'message': str(e)
+            }
+
+    items = []
+
+    def fan_out(cameras):
+        results = map_concurrently(update_camera, cameras)
+        items.extend(result for result in results if result is not None)
+        # Cameras that were not reached before the deadline are resumed
+        return [
+            thing_name for thing_name, result in zip(cameras, results)
+            if result is None
+        ]
+
+    cameras = fan_out(cameras)
+    if len(cameras) == 0 and more:
+        pages = PageIterator(
+            group_camera_data,
+            account_id,
+            group_name,
+            params=QueryParams(next_token=page_token),
+            projection=['id'])
+        for page in pages:
+            if past_deadline(deadline):
+                break
+            cameras = fan_out([item['id'] for item in page.items])
+            page_token = page.next_token
+            more = page_token is not None
+            if len(cameras) > 0:
+                break
+    next_token = None
+    if len(cameras) > 0 or more:
+        next_token = encode_token({
+            'cameras': cameras,
+            'nextToken': page_token,
+            'more': more
+        })
+    return {
+        'items': items,
+        'nextToken': next_token
+    }
+
+
+def _publish_group(iot_data, group_camera_data, group_name, create_event):
+    thing_names = unique_targets(item['id'] for item in all_items(
+        group_camera_data,
+        request.account_id(),
+        group_name,
+        projection=['id']))
+    if thing_names is None:
+        response.status_code = 400
+        return {
+            'message': f'At most {MAX_TARGETS} cameras can be targeted at once.'
+        }
+    return {
+        'items': publish_events(iot_data, thing_names, create_event)
+    }
+
+
+@api.route("/groups/:group_name/captureImage", methods=['POST'])
+def start_group_capture_image(iot_data, group_camera_data, group_name):
+    return _publish_group(iot_data, group_camera_data, group_name, capture_image_event)
+
+
+@api.route("/groups/:group_name/captureImage")
+def list_group_captured_images(
+        s3,
+        bucket_name,
+        image_prefix,
+        group_camera_data,
+        group_name):
+    thing_names = [
+        item['id'] for item in all_items(
+            group_camera_data,
+            request.account_id(),
+            group_name,
+            projection=['id'])
+    ]
+    return {
+        'items': lookup_thumbnails(
+            s3,
+            bucket_name,
+            image_prefix,
+            thing_names,
+            include_url=request.queryparams.get('includeUrl', 'false') == 'true')
+    }
+
+
+@api.route("/groups/:group_name/captureVideo", methods=['POST'])
+def start_group_capture_video(iot_data, group_camera_data, group_name):
+    body = json.loads(request.body) if request.body != "" else {}
+    return _publish_group(iot_data, group_camera_data, group_name, partial(capture_video_event, body=body))
+
+
+@api.route("/groups/:group_name/stats", methods=['POST'])
+def start_group_health(iot_data, group_camera_data, group_name):
+    return _publish_group(iot_data, group_camera_data, group_name, health_event)
 
 
 @api.route("/groups/:group_name/cameras/:thing_name", methods=['DELETE'])
@@ -68,7 +232,7 @@ def delete_group_camera(
         },
         'delete': True
     })
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
 
 
 @api.route("/groups", methods=['POST'])
@@ -106,40 +270,21 @@ def delete_group(
         camera_group_data,
         group_camera_data,
         group_name):
-    truncated = True
-    next_token = None
-    updates = [{
-        'repository': group_data,
-        'item': {
-            'name': group_name
-        },
-        'delete': True
-    }]
-    while truncated:
-        page = group_camera_data.items(
-            request.account_id(),
-            group_name,
-            params=QueryParams(next_token=next_token))
-        for item in page.items:
-            updates.append({
-                'repository': group_camera_data,
-                'parent_ids': [group_name],
-                'item': {
-                    'id': item['id']
-                },
-                'delete': True
-            })
-            updates.append({
-                'repository': camera_group_data,
-                'parent_ids': [item['id']],
-                'item': {
-                    'id': group_name
-                },
-                'delete': True
-            })
-        next_token = page.next_token
-        truncated = next_token is not None
-    Repository.batch_write(request.account_id(), updates=updates)
+    return delete_cascade(request, response, CascadeDelete(
+        request.account_id(),
+        relations=[
+            Relation(group_camera_data, [group_name], lambda item: [
+                edge_delete(group_camera_data, group_name, item['id']),
+                edge_delete(camera_group_data, item['id'], group_name),
+            ], projection=['id'])
+        ],
+        updates=[{
+            'repository': group_data,
+            'item': {
+                'name': group_name
+            },
+            'delete': True
+        }]))
 
 
 @api.route("/groups/:group_name", methods=['PUT'])
@@ -160,19 +305,8 @@ def list_groups(group_data):
             'items': page.items,
             'nextToken': page.next_token
         }
-    item_ids = re.split('\\s*,\\s*', group_names)
-    limit = get_limit(request)
-    if len(item_ids) > limit:
-        response.status_code = 400
-        return {
-            'message': f'Provided {len(item_ids)} is more than {limit}.'
-        }
-    return {
-        'items': Repository.batch_read(
-            request.account_id(),
-            reads=[
-                {'id': item_id, 'repository': group_data}
-                for item_id in item_ids
-            ]
-        )
-    }
+    return read_items(
+        request,
+        response,
+        group_data,
+        re.split('\\s*,\\s*', group_names))
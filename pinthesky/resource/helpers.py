@@ -1,12 +1,129 @@
+import base64
+import json
+import os
+import re
+from time import monotonic
+from pinthesky.batch import UnprocessedKeysException, batch_get, batch_write
+from pinthesky.cascade import InvalidCascadeException
 from pinthesky.conversion import sort_filters_for
+from pinthesky.job_status import resolve_statuses
+from pinthesky.pages import PageIterator
 from ophis.database import MAX_ITEMS, QueryParams
 
 
+DEADLINE_BUFFER_MS = int(os.getenv('DEADLINE_BUFFER_MS', '3000'))
+MAX_READ_IDS = 1000
+
+
 def get_limit(request, default_max=MAX_ITEMS):
     limit = int(request.queryparams.get('limit', default_max))
     return min(MAX_ITEMS, max(1, limit))
 
 
+def get_expansions(request, supported):
+    expand = request.queryparams.get('expand', '')
+    expansions = [e for e in re.split('\\s*,\\s*', expand) if e != '']
+    return expansions, [e for e in expansions if e not in supported]
+
+
+def get_deadline(request, buffer_ms=DEADLINE_BUFFER_MS):
+    remaining = getattr(request.context, 'get_remaining_time_in_millis', None)
+    if remaining is None:
+        return None
+    return monotonic() + (remaining() - buffer_ms) / 1000
+
+
+def encode_token(value):
+    content = json.dumps(value).encode('utf-8')
+    return base64.urlsafe_b64encode(content).decode('utf-8')
+
+
+def decode_token(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode('utf-8')))
+    except ValueError:
+        return None
+
+
+def delete_cascade(request, response, cascade):
+    state = None
+    next_token = request.queryparams.get('nextToken', None)
+    if next_token is not None:
+        state = decode_token(next_token)
+        if not isinstance(state, dict):
+            response.status_code = 400
+            return {
+                'message': f'Invalid nextToken {next_token}.'
+            }
+    try:
+        state = cascade.run(state, deadline=get_deadline(request))
+    except InvalidCascadeException as e:
+        response.status_code = 400
+        return {
+            'message': str(e)
+        }
+    if state is not None:
+        response.status_code = 202
+        return {
+            'nextToken': encode_token(state)
+        }
+
+
+def read_items(request, response, repository, item_ids, *args):
+    """
+    Reads the items by id in request order, along with the ids that do
+    not exist.
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    if len(item_ids) > MAX_READ_IDS:
+        response.status_code = 400
+        return {
+            'message': f'At most {MAX_READ_IDS} items can be read at once.'
+        }
+    try:
+        items = batch_get(request.account_id(), *args, reads=[
+            {'id': item_id, 'repository': repository}
+            for item_id in item_ids
+        ])
+    except UnprocessedKeysException as e:
+        response.status_code = 503
+        return {
+            'message': str(e)
+        }
+    return {
+        'items': [item for item in items if item is not None],
+        'missing': [item_id for item_id, item in zip(item_ids, items) if item is None]
+    }
+
+
+def write_updates(request, response, updates):
+    result = batch_write(request.account_id(), updates=updates)
+    if len(result.failures) > 0:
+        response.status_code = 503
+        return {
+            'message': f'Failed to write {len(result.failures)} items.',
+            'failures': [update['item'] for update in result.failures]
+        }
+
+
+def include_statuses(request, iot, job_data, camera_job_data, jobs):
+    if request.queryparams.get('includeStatus', 'false') == 'true':
+        statuses = resolve_statuses(
+            iot,
+            job_data,
+            camera_job_data,
+            request.account_id(),
+            jobs,
+            deadline=get_deadline(request))
+        for job, status in zip(jobs, statuses):
+            job.update(status)
+    return jobs
+
+
+def all_items(repository, *args, projection=None):
+    return PageIterator(repository, *args, projection=projection).items()
+
+
 def create_query_params(
         request,
         sort_order='ascending',
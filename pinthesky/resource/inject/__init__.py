@@ -1,12 +1,13 @@
-import boto3
 import os
 from ophis.globals import app_context
+from pinthesky.clients import ClientFactory
 
 TABLE_NAME = os.getenv('TABLE_NAME', 'Pits')
 
-ddb = boto3.resource('dynamodb')
-app_context.inject('dynamodb', ddb)
-app_context.inject('table', ddb.Table(TABLE_NAME))
+clients = ClientFactory()
+app_context.inject('clients', clients)
+app_context.inject('dynamodb', clients.resource('dynamodb'))
+app_context.inject('table', clients.table(TABLE_NAME))
 app_context.inject('first_index', os.getenv('INDEX_NAME_1', 'GS1'))
 app_context.inject('bucket_name', os.getenv('BUCKET_NAME', 'NOT_FOUND'))
 app_context.inject('image_prefix', os.getenv('IMAGE_PREFIX', 'images'))
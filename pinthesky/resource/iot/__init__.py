@@ -1,4 +1,3 @@
-import boto3
 import os
 from pinthesky import api
 from ophis.globals import app_context, request
@@ -8,10 +7,11 @@ from pinthesky.resource.helpers import get_limit
 DATA_ENDPOINT = f'https://{os.getenv("DATA_ENDPOINT")}'
 
 
-app_context.inject('iot', boto3.client('iot'))
+clients = app_context.resolve('GLOBAL')['clients']
+app_context.inject('iot', clients.client('iot'))
 app_context.inject(
     name='iot_data',
-    value=boto3.client('iot-data', endpoint_url=DATA_ENDPOINT))
+    value=clients.client('iot-data', endpoint_url=DATA_ENDPOINT))
 
 
 @api.route("/iot/groups")
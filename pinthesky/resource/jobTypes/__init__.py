@@ -1,53 +1,20 @@
-import json
 from pinthesky.resource import api
 from ophis.globals import response
-from pinthesky.resource.jobs import JOB_TYPES
-
-JOB_PARAMETERS = {
-    'shutdown': [
-        'user'
-    ],
-    'service-logs': [
-        'user',
-        'service',
-        'lines',
-        'pattern',
-        'since',
-        'until'
-    ],
-    'reboot': [
-        'user'
-    ],
-    'update': [
-        'user',
-        'version'
-    ],
-}
-
-
-def _create_job_type(job_name):
-    document = json.loads(JOB_TYPES[job_name])
-    return {
-        'name': job_name,
-        'description': document['_comment'],
-        'version': document['version'],
-        'parameters': JOB_PARAMETERS[job_name]
-    }
+import pinthesky.resource.jobs  # noqa: F401 injects the job_types registry
 
 
 @api.route('/jobTypes')
-def list_job_types():
-    return {
-        'items': [_create_job_type(job_name) for job_name in JOB_PARAMETERS.keys()],
-        'nextToken': None
-    }
+def list_job_types(job_types):
+    response.headers['content-type'] = 'application/json'
+    return job_types.listing
 
 
 @api.route('/jobTypes/:job_name')
-def describe_job_type(job_name):
-    if job_name not in JOB_PARAMETERS:
+def describe_job_type(job_types, job_name):
+    if job_name not in job_types:
         response.status_code = 404
         return {
             'message': f'Job of name {job_name} does not exist.'
         }
-    return _create_job_type(job_name)
+    response.headers['content-type'] = 'application/json'
+    return job_types.descriptions[job_name]
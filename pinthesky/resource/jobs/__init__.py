@@ -1,19 +1,33 @@
 import json
+import logging
+import os
 from datetime import datetime
 from math import floor
-from string import Template
 from time import time
 from uuid import uuid4
 from botocore.exceptions import ClientError
-from pinthesky.database import DeviceJobs, DeviceToJobs
-from ophis.database import QueryParams, Repository
+from pinthesky.batch import batch_write
+from pinthesky.concurrency import map_concurrently
+from pinthesky.database import DeviceJobs, DeviceJobSummaries, DeviceToJobs
+from pinthesky.fleet import add_things_to_thing_group, delete_thing_group, ensure_thing_group, thing_group_name
+from pinthesky.job_status import describe_status, is_terminal, job_status_cache, list_executions, persist_status
+from pinthesky.job_status import persisted_status, resolve_status
+from pinthesky.job_summary import job_summary_cache, restore_summary, summarize_executions
+from pinthesky.job_types import InvalidParametersException, JobTypeRegistry
+from ophis.database import ConflictException
 from ophis.globals import app_context, request, response
 from pinthesky.resource import api
-from pinthesky.resource.helpers import create_query_params, get_limit
+from pinthesky.resource.helpers import all_items, create_query_params, get_limit, include_statuses, write_updates
 
 
+LARGE_FLEET_THRESHOLD = int(os.getenv('LARGE_FLEET_THRESHOLD', '100'))
+POPULATE_JOB_ROUTE_KEY = 'pits:populateJobTargets'
+
+logger = logging.getLogger(__name__)
+
 app_context.inject('job_data', DeviceJobs())
 app_context.inject('camera_job_data', DeviceToJobs())
+app_context.inject('job_summary_data', DeviceJobSummaries())
 
 
 def _convert_cloud_to_dto(item):
@@ -42,7 +56,11 @@ def _upsert_job_definition(job_data, job_id, verify_terminal, thunk, strip_field
     item = {'jobId': job_id}
     if verify_terminal:
         item["status"] = "CANCELED"
+    if 'description' in kwargs:
+        item['description'] = kwargs['description']
     thunk(**kwargs)
+    job_status_cache.invalidate(job_id)
+    job_summary_cache.invalidate(job_id)
     return job_data.update(request.account_id(), item=item)
 
 
@@ -166,10 +184,11 @@ JOB_TYPES = {
 }
     """
 }
+app_context.inject('job_types', JobTypeRegistry(JOB_TYPES))
 
 
 @api.route('/jobs')
-def list_jobs(job_data, first_index):
+def list_jobs(job_data, camera_job_data, iot, first_index):
     page = job_data.items_index(
         request.account_id(),
         index_name=first_index,
@@ -179,13 +198,75 @@ def list_jobs(job_data, first_index):
         )
     )
     return {
-        'items': page.items,
+        'items': include_statuses(request, iot, job_data, camera_job_data, page.items),
         'nextToken': page.next_token
     }
 
 
+def _expand_targets(group_camera_data, cameras, groups):
+    # Cameras targeted directly and through groups are only targeted once
+    targets = dict.fromkeys(cameras)
+
+    def list_group_thing_names(group):
+        return [
+            item['id'] for item in all_items(
+                group_camera_data,
+                request.account_id(),
+                group,
+                projection=['id'])
+        ]
+    groups = list(dict.fromkeys(groups))
+    for thing_names in map_concurrently(list_group_thing_names, groups):
+        targets.update(dict.fromkeys(thing_names))
+    return list(targets)
+
+
+def _camera_job_updates(camera_job_data, item, thing_names):
+    return [
+        {
+            'repository': camera_job_data,
+            'parent_ids': [thing_name],
+            'item': {
+                **item,
+                'GS1-PK': camera_job_data.make_hash_key(
+                    request.account_id(),
+                    thing_name
+                )
+            }
+        }
+        for thing_name in thing_names
+    ]
+
+
+def _populate_event(payload):
+    path = f'/jobs/{payload["jobId"]}/targets'
+    return {
+        'version': '2.0',
+        'routeKey': POPULATE_JOB_ROUTE_KEY,
+        'rawPath': path,
+        'rawQueryString': '',
+        'headers': {},
+        'queryStringParameters': {},
+        'requestContext': {
+            'accountId': request.account_id(),
+            'http': {
+                'method': 'POST',
+                'path': path,
+            },
+            'routeKey': POPULATE_JOB_ROUTE_KEY,
+        },
+        'body': json.dumps(payload),
+    }
+
+
 @api.route('/jobs', methods=["POST"])
-def create_job(iot, job_data, group_camera_data, camera_job_data):
+def create_job(
+        iot,
+        clients,
+        job_data,
+        group_camera_data,
+        camera_job_data,
+        job_types):
     payload = json.loads(request.body)
     create_time = floor(time())
     job_id = str(uuid4())
@@ -198,10 +279,10 @@ def create_job(iot, job_data, group_camera_data, camera_job_data):
         request.account_id(),
         'thing'
     ])
-    if 'type' not in payload or payload['type'] not in JOB_TYPES:
+    if 'type' not in payload or payload['type'] not in job_types:
         response.status_code = 400
         return {
-            'message': f'Invalid type. Valid types: {list(JOB_TYPES.keys())}'
+            'message': f'Invalid type. Valid types: {job_types.names()}'
         }
 
     def thing_arn(thing_name):
@@ -211,31 +292,27 @@ def create_job(iot, job_data, group_camera_data, camera_job_data):
     description = payload.get('description', default_description)
     if description == '':
         description = default_description
+    thing_names = _expand_targets(
+        group_camera_data,
+        cameras=payload.get('cameras', []),
+        groups=payload.get('groups', []))
+    if len(thing_names) == 0:
+        response.status_code = 400
+        return {
+            'message': 'Need to supply a camera or group of cameras.'
+        }
     kwargs = {
         'jobId': job_id,
-        'targets': list(map(thing_arn, payload.get('cameras', []))),
         'description': description,
     }
-    for group in payload.get('groups', []):
-        truncated = True
-        params = QueryParams()
-        while truncated:
-            page = group_camera_data.items(
-                request.account_id(),
-                group,
-                params=params)
-            for item in page.items:
-                kwargs['targets'].append(thing_arn(item['id']))
-            params = QueryParams(next_token=page.next_token)
-            truncated = params.next_token is not None
-    if len(kwargs['targets']) == 0:
+    try:
+        kwargs['document'], parameters = job_types[payload['type']].render(
+            payload.get('parameters', {}))
+    except InvalidParametersException as e:
         response.status_code = 400
         return {
-            'message': 'Need to supply a camera or group of cameras.'
+            'message': str(e)
         }
-    template = Template(JOB_TYPES[payload['type']])
-    parameters = dict((key, value) for key, value in payload.get('parameters', {'user': 'root'}).items() if value is not None or value != '')
-    kwargs['document'] = template.safe_substitute(**parameters)
     kwargs['jobExecutionsRetryConfig'] = payload.get('retryConfig', {
         'criteriaList': [
             {
@@ -244,14 +321,17 @@ def create_job(iot, job_data, group_camera_data, camera_job_data):
             }
         ]
     })
-    resp = iot.create_job(**kwargs)
     item = {
-        'jobId': resp['jobId'],
+        'jobId': job_id,
         'type': payload['type'],
         'parameters': parameters,
         'createTime': create_time,
         'updateTime': create_time,
     }
+    if payload.get('largeFleet', len(thing_names) > LARGE_FLEET_THRESHOLD):
+        return _create_large_fleet_job(clients, job_data, payload, kwargs, item)
+    kwargs['targets'] = list(map(thing_arn, thing_names))
+    iot.create_job(**kwargs)
     updates = [{
         'repository': job_data,
         'item': {
@@ -259,36 +339,107 @@ def create_job(iot, job_data, group_camera_data, camera_job_data):
             'GS1-PK': job_data.make_hash_key(request.account_id())
         }
     }]
-    for camera in kwargs['targets']:
-        thing_name = camera.split('/')[-1]
-        updates.append({
-            'repository': camera_job_data,
-            'parent_ids': [thing_name],
-            'item': {
-                **item,
-                'GS1-PK': camera_job_data.make_hash_key(
-                    request.account_id(),
-                    thing_name
-                )
-            }
-        })
-    Repository.batch_write(request.account_id(), updates=updates)
+    updates.extend(_camera_job_updates(camera_job_data, item, thing_names))
+    failed = write_updates(request, response, updates)
+    if failed is not None:
+        return failed
     return item
 
 
+def _create_large_fleet_job(clients, job_data, payload, kwargs, item):
+    # The IoT job targets a snapshot of the thing group, so it is created
+    # by the asynchronous invocation once the group is populated
+    job = {
+        **item,
+        'thingGroupName': thing_group_name(item['jobId']),
+        'targetStatus': 'populating',
+    }
+    job_data.create(request.account_id(), item={
+        **job,
+        'GS1-PK': job_data.make_hash_key(request.account_id())
+    })
+    clients.client('lambda').invoke(
+        FunctionName=request.context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(_populate_event({
+            'jobId': item['jobId'],
+            'thingGroupName': job['thingGroupName'],
+            'cameras': payload.get('cameras', []),
+            'groups': payload.get('groups', []),
+            'job': {key: value for key, value in kwargs.items() if key != 'jobId'},
+            'item': item,
+        })))
+    return job
+
+
+@api.routeKey(POPULATE_JOB_ROUTE_KEY)
+def populate_job_targets(iot, job_data, group_camera_data, camera_job_data):
+    payload = json.loads(request.body)
+    job_id = payload['jobId']
+    group_name = payload['thingGroupName']
+
+    def fail(message, created):
+        logger.warning(f'Failed to populate targets for {job_id}: {message}')
+        update = {'jobId': job_id, 'targetStatus': 'failed'}
+        if not created:
+            # Without an IoT job the status is final, and nothing else
+            # would delete the group
+            delete_thing_group(iot, group_name)
+            update['status'] = 'CANCELED'
+            update['description'] = payload['job']['description']
+        job_data.update(request.account_id(), item=update)
+
+    thing_names = _expand_targets(
+        group_camera_data,
+        cameras=payload['cameras'],
+        groups=payload['groups'])
+    try:
+        group_arn = ensure_thing_group(iot, group_name)
+    except ClientError as e:
+        return fail(str(e), created=False)
+    added = add_things_to_thing_group(iot, group_name, thing_names)
+    # Things that could not join the group are not targeted by the job
+    targets = [thing_name for thing_name, joined in zip(thing_names, added) if joined]
+    if len(targets) == 0:
+        return fail('no camera joined the thing group', created=False)
+    try:
+        iot.create_job(
+            jobId=job_id,
+            targets=[group_arn],
+            targetSelection='SNAPSHOT',
+            **payload['job'])
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceAlreadyExistsException':
+            return fail(str(e), created=False)
+    result = batch_write(
+        request.account_id(),
+        updates=_camera_job_updates(camera_job_data, payload['item'], targets))
+    if len(result.failures) > 0:
+        return fail(f'{len(result.failures)} camera jobs were not written', created=True)
+    job_data.update(request.account_id(), item={
+        'jobId': job_id,
+        'targetStatus': 'populated',
+        'failedTargets': len(thing_names) - len(targets),
+    })
+    logger.info(f'Populated {len(targets)} of {len(thing_names)} targets for {job_id}')
+
+
 @api.route('/jobs/:job_id')
-def describe_job(job_data, job_id, iot):
+def describe_job(job_data, camera_job_data, job_id, iot):
     job = job_data.get(request.account_id(), item_id=job_id)
     if job is None:
         response.status_code = 404
         return {
             'message': f'Job with id {job_id} does not exist.'
         }
-    resp = iot.describe_job(jobId=job_id)
     return {
         **job,
-        'status': resp['job']['status'],
-        'description': resp['job']['description']
+        **resolve_status(
+            iot,
+            job_data,
+            camera_job_data,
+            request.account_id(),
+            job)
     }
 
 
@@ -318,9 +469,10 @@ def cancel_job(job_data, job_id, iot):
 
 
 @api.route('/jobs/:job_id', methods=['DELETE'])
-def delete_job(job_data, job_id, iot):
+def delete_job(job_data, job_summary_data, job_id, iot):
     iot.delete_job(jobId=job_id)
     job_data.delete(request.account_id(), item_id=job_id)
+    job_summary_data.delete(request.account_id(), item_id=job_id)
 
 
 @api.route('/jobs/:job_id/executions')
@@ -349,6 +501,54 @@ def list_job_executions(job_data, job_id, iot):
     }
 
 
+@api.route('/jobs/:job_id/summary')
+def summarize_job_executions(job_data, job_summary_data, camera_job_data, job_id, iot):
+    job = job_data.get(request.account_id(), item_id=job_id)
+    if job is None:
+        response.status_code = 404
+        return {
+            'message': f'Job with id {job_id} does not exist.'
+        }
+    summary = job_summary_cache.get(job_id)
+    if summary is not None:
+        return summary
+    status = persisted_status(job)
+    if status is not None:
+        # Summaries of terminal jobs are final, and stored beside the job
+        summary = job_summary_data.get(request.account_id(), item_id=job_id)
+        if summary is not None:
+            return restore_summary(summary['summary'])
+    else:
+        status = describe_status(iot, job)
+    executions = list(list_executions(iot, job_id))
+    summary = {
+        'jobId': job_id,
+        'status': status['status'],
+        **summarize_executions(executions)
+    }
+    if is_terminal(status['status']):
+        if persisted_status(job) is None:
+            persist_status(
+                iot,
+                job_data,
+                camera_job_data,
+                request.account_id(),
+                job,
+                status,
+                executions=executions)
+        try:
+            job_summary_data.create(request.account_id(), item={
+                'jobId': job_id,
+                'summary': summary
+            })
+        except ConflictException:
+            # Another request stored the same final summary
+            pass
+    else:
+        job_summary_cache.put(job_id, summary)
+    return summary
+
+
 @api.route('/jobs/:job_id/executions/:thing_name')
 def describe_job_execution(job_id, thing_name, iot):
     kwargs = {'jobId': job_id, 'thingName': thing_name}
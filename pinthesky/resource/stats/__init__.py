@@ -1,9 +1,8 @@
 import re
-from ophis.database import Repository
 from ophis .globals import app_context, request, response
 from pinthesky.database import DeviceHealth
 from pinthesky.resource import api
-from pinthesky.resource.helpers import create_query_params, get_limit
+from pinthesky.resource.helpers import create_query_params, read_items
 
 app_context.inject('stats_data', DeviceHealth())
 
@@ -21,20 +20,9 @@ def list_latest(stats_data):
             'items': page.items,
             'nextToken': page.next_token
         }
-    item_ids = re.split('\\s*,\\s*', thing_names)
-    limit = get_limit(request)
-    if len(item_ids) > limit:
-        response.status_code = 400
-        return {
-            'message': f'Provided {len(item_ids)} is more than {limit}.'
-        }
-    return {
-        'items': Repository.batch_read(
-            request.account_id(),
-            'latest',
-            reads=[
-                {'id': item_id, 'repository': stats_data}
-                for item_id in item_ids
-            ]
-        )
-    }
+    return read_items(
+        request,
+        response,
+        stats_data,
+        re.split('\\s*,\\s*', thing_names),
+        'latest')
@@ -1,10 +1,9 @@
-import boto3
-
 from ophis.globals import app_context
 from pinthesky import api
 
 
-app_context.inject('s3', boto3.client('s3'))
+clients = app_context.resolve('GLOBAL')['clients']
+app_context.inject('s3', clients.client('s3'))
 
 
 @api.route('/storage/info')
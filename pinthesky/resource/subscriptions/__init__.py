@@ -1,4 +1,3 @@
-import boto3
 import json
 from ophis.globals import app_context, request, response
 from botocore.exceptions import ClientError
@@ -7,7 +6,7 @@ from pinthesky.resource import api
 from pinthesky.resource.helpers import create_query_params
 
 app_context.inject('subscription_data', Subscriptions())
-app_context.inject('sns', boto3.resource('sns'))
+app_context.inject('sns', app_context.resolve('GLOBAL')['clients'].resource('sns'))
 
 
 @api.route('/subscriptions')
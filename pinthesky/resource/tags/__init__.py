@@ -1,10 +1,12 @@
 import json
-from ophis.database import ConflictException, NotFoundException, QueryParams, Repository
+from ophis.database import ConflictException, NotFoundException
 from ophis.globals import app_context, request, response
+from pinthesky.cascade import CascadeDelete, Relation, edge_delete
 from pinthesky.conversion import hashed_video
 from pinthesky.database import Tags, TagsToVideos, VideosToTags
 from pinthesky.resource import api
-from pinthesky.resource.helpers import create_query_params
+from pinthesky.resource.helpers import create_query_params, delete_cascade, write_updates
+from pinthesky.s3 import sign_videos
 
 app_context.inject('tag_data', Tags())
 app_context.inject('tag_video_data', TagsToVideos())
@@ -66,45 +68,31 @@ def update_tag(tag_data, tag_name):
 
 @api.route('/tags/:tag_name', methods=['DELETE'])
 def delete_tag(tag_data, tag_video_data, video_tag_data, tag_name):
-    updates = [{
-        'repository': tag_data,
-        'delete': True,
-        'item': {
-            'name': tag_name
-        }
-    }]
-    truncated = True
-    next_token = None
-    while truncated:
-        page = tag_video_data.items(
-            request.account_id(),
-            tag_name,
-            params=QueryParams(next_token=next_token)
-        )
-        for item in page.items:
-            updates.append({
-                'repository': tag_video_data,
-                'parent_ids': [tag_name],
-                'delete': True,
-                'item': {
-                    'id': item['id']
-                }
-            })
-            updates.append({
-                'repository': video_tag_data,
-                'parent_ids': [item['id']],
-                'delete': True,
-                'item': {
-                    'id': tag_name
-                }
-            })
-        next_token = page.next_token
-        truncated = next_token is not None
-    Repository.batch_write(request.account_id(), updates=updates)
+    return delete_cascade(request, response, CascadeDelete(
+        request.account_id(),
+        relations=[
+            Relation(tag_video_data, [tag_name], lambda item: [
+                edge_delete(tag_video_data, tag_name, item['id']),
+                edge_delete(video_tag_data, item['id'], tag_name),
+            ], projection=['id'])
+        ],
+        updates=[{
+            'repository': tag_data,
+            'delete': True,
+            'item': {
+                'name': tag_name
+            }
+        }]))
 
 
 @api.route('/tags/:tag_name/videos', methods=['GET'])
-def list_tagged_videos(tag_video_data, first_index, tag_name):
+def list_tagged_videos(
+        tag_video_data,
+        s3,
+        bucket_name,
+        video_prefix,
+        first_index,
+        tag_name):
     page = tag_video_data.items_index(
         request.account_id(),
         tag_name,
@@ -114,6 +102,8 @@ def list_tagged_videos(tag_video_data, first_index, tag_name):
             sort_order='descending'
         )
     )
+    if request.queryparams.get('includeUrls', 'false') == 'true':
+        sign_videos(s3, bucket_name, video_prefix, page.items)
     return {
         'items': page.items,
         'nextToken': page.next_token
@@ -159,7 +149,7 @@ def tag_videos(tag_video_data, video_tag_data, tag_name):
                 'expiresIn': video['expiresIn']
             }
         })
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
 
 
 @api.route('/tags/:tag_name/videos/:video_id', methods=['DELETE'])
@@ -181,4 +171,4 @@ def untag_videos(tag_video_data, video_tag_data, tag_name, video_id):
             'id': tag_name
         }
     })
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
@@ -1,28 +1,291 @@
+import heapq
 import json
-from ophis.database import QueryParams, Repository
+import re
+from itertools import groupby, islice
+from ophis.database import MAX_ITEMS, QueryParams, QueryResults, SortFilter
 from ophis.globals import app_context, request, response
 from pinthesky import api
-from pinthesky.conversion import hashed_video
+from pinthesky.batch import batch_get
+from pinthesky.cascade import CascadeDelete, Relation, edge_delete
+from pinthesky.concurrency import map_concurrently
+from pinthesky.conversion import hashed_video, isoformat_to_timestamp, timestamp_to_motion
 from pinthesky.database import MotionVideos
-from pinthesky.resource.helpers import create_query_params
-from pinthesky.s3 import generate_presigned_url
+from pinthesky.pages import PageIterator, query_page, start_after, valid_token
+from pinthesky.resource.helpers import all_items, create_query_params, decode_token, delete_cascade, encode_token
+from pinthesky.resource.helpers import get_expansions, get_limit, write_updates
+from pinthesky.s3 import generate_presigned_url, sign_videos, video_key
 
 
 app_context.inject('motion_videos_data', MotionVideos())
 
+VIDEO_EXPANSIONS = ['tags']
+# Every merged camera is queried concurrently on each page
+MAX_VIDEO_CAMERAS = 100
+
+
+def _expand_videos(videos, expansions, video_tag_data, tag_data):
+    if 'tags' in expansions:
+        def list_tag_names(video):
+            return [
+                item['id'] for item in all_items(
+                    video_tag_data,
+                    request.account_id(),
+                    hashed_video(video['motionVideo'], video['thingName']),
+                    projection=['id'])
+            ]
+        video_tags = map_concurrently(list_tag_names, videos)
+        tag_names = list(dict.fromkeys(
+            tag_name for names in video_tags for tag_name in names
+        ))
+        tags = dict(zip(tag_names, batch_get(
+            request.account_id(),
+            reads=[
+                {'id': tag_name, 'repository': tag_data}
+                for tag_name in tag_names
+            ]
+        )))
+        for video, names in zip(videos, video_tags):
+            video['tags'] = [
+                tags[name] for name in names if tags[name] is not None
+            ]
+    return videos
+
+
+def _merge_camera_videos(motion_videos_data, thing_names, params):
+    """
+    Merges a page of the videos of every camera by motion video, from
+    concurrent queries for each camera. The next token holds the cursor
+    of every camera that still has videos, None to start from the top.
+    """
+    cursors = dict.fromkeys(thing_names)
+    if params.next_token is not None:
+        state = decode_token(params.next_token)
+        if not isinstance(state, dict):
+            return None
+        cursors = {
+            thing_name: state[thing_name]
+            for thing_name in thing_names if thing_name in state
+        }
+        for thing_name, cursor in cursors.items():
+            if cursor is not None and not isinstance(cursor, str):
+                return None
+            if not valid_token(motion_videos_data, request.account_id(), thing_name, next_token=cursor):
+                return None
+
+    def query(thing_name):
+        return query_page(
+            motion_videos_data,
+            request.account_id(),
+            thing_name,
+            params=params._replace(next_token=cursors[thing_name]))
+    pages = dict(zip(cursors.keys(), map_concurrently(query, list(cursors.keys()))))
+    # Each camera's videos are already sorted by motion video
+    streams = [
+        [(video['motionVideo'], thing_name, video) for video in page.items]
+        for thing_name, page in pages.items()
+    ]
+    merged = list(islice(heapq.merge(
+        *streams,
+        key=lambda entry: entry[:2],
+        reverse=not params.sort_ascending), params.limit))
+    last_videos = {}
+    for _, thing_name, video in merged:
+        last_videos[thing_name] = video
+    next_cursors = {}
+    for thing_name, page in pages.items():
+        consumed = sum(1 for _, name, _ in merged if name == thing_name)
+        if consumed < len(page.items):
+            next_cursors[thing_name] = cursors[thing_name]
+            if thing_name in last_videos:
+                next_cursors[thing_name] = start_after(
+                    motion_videos_data,
+                    request.account_id(),
+                    thing_name,
+                    item=last_videos[thing_name])
+        elif page.next_token is not None:
+            next_cursors[thing_name] = page.next_token
+    return QueryResults(
+        items=[video for _, _, video in merged],
+        next_token=encode_token(next_cursors) if len(next_cursors) > 0 else None)
+
 
 @api.route("/videos")
-def list_motion_videos(motion_videos_data, first_index):
-    page = motion_videos_data.items_index(
+def list_motion_videos(
+        motion_videos_data,
+        video_tag_data,
+        tag_data,
+        first_index):
+    expansions, invalid = get_expansions(request, VIDEO_EXPANSIONS)
+    if len(invalid) > 0:
+        response.status_code = 400
+        return {
+            'message': f'Invalid expand {invalid}. Valid: {VIDEO_EXPANSIONS}'
+        }
+    thing_names = request.queryparams.get('thingName', None)
+    if thing_names is not None:
+        thing_names = list(dict.fromkeys(re.split('\\s*,\\s*', thing_names)))
+        if len(thing_names) > MAX_VIDEO_CAMERAS:
+            response.status_code = 400
+            return {
+                'message': f'At most {MAX_VIDEO_CAMERAS} cameras can be listed at once.'
+            }
+        page = _merge_camera_videos(
+            motion_videos_data,
+            thing_names,
+            create_query_params(
+                request=request,
+                sort_order='descending',
+                sort_field='motionVideo',
+                format=timestamp_to_motion))
+        if page is None:
+            response.status_code = 400
+            return {
+                'message': f'Invalid nextToken {request.queryparams["nextToken"]}.'
+            }
+    else:
+        page = motion_videos_data.items_index(
+            request.account_id(),
+            index_name=first_index,
+            params=create_query_params(
+                request=request,
+                sort_order='descending'
+            ))
+    return {
+        'items': _expand_videos(
+            page.items,
+            expansions,
+            video_tag_data=video_tag_data,
+            tag_data=tag_data),
+        'nextToken': page.next_token
+    }
+
+
+def _split_tags(name):
+    tags = request.queryparams.get(name, '')
+    return list(dict.fromkeys(t for t in re.split('\\s*,\\s*', tags) if t != ''))
+
+
+def _create_time_filters(start_time, end_time, cursor_time, ascending):
+    lower = isoformat_to_timestamp(start_time) if start_time is not None else None
+    upper = isoformat_to_timestamp(end_time) if end_time is not None else None
+    # The page resumes within the videos created at the cursor time
+    if cursor_time is not None and ascending:
+        lower = cursor_time if lower is None else max(lower, cursor_time)
+    elif cursor_time is not None:
+        upper = cursor_time if upper is None else min(upper, cursor_time)
+    if lower is not None and upper is not None:
+        return [SortFilter(name='createTime', method='between', values=[lower, upper])]
+    if lower is not None:
+        return [SortFilter(name='createTime', method='gte', values=[lower])]
+    if upper is not None:
+        return [SortFilter(name='createTime', method='lte', values=[upper])]
+    return []
+
+
+def _tagged_by_create_time(tag_video_data, first_index, tag_name, params):
+    pages = PageIterator(
+        tag_video_data,
         request.account_id(),
+        tag_name,
         index_name=first_index,
-        params=create_query_params(
-            request=request,
-            sort_order='descending'
-        ))
+        params=params)
+    for create_time, videos in groupby(pages.items(), key=lambda video: video['createTime']):
+        yield create_time, {video['id']: video for video in videos}
+
+
+def _merge_tagged(streams, all_tags, any_tags, ascending):
+    """
+    Merges the videos of every tag by create time, yielding the videos in
+    all of all_tags and any of any_tags, along with their position among
+    the videos created at the same time.
+    """
+    heads = []
+
+    def advance(index):
+        group = next(streams[index][1], None)
+        if group is None:
+            return False
+        create_time, videos = group
+        sort_key = create_time if ascending else -create_time
+        heapq.heappush(heads, (sort_key, index, create_time, videos))
+        return True
+
+    for index, (tag_name, _) in enumerate(streams):
+        if not advance(index) and tag_name in all_tags:
+            return
+    exhausted = False
+    while len(heads) > 0:
+        create_time = heads[0][2]
+        tagged = {}
+        while len(heads) > 0 and heads[0][2] == create_time:
+            _, index, _, videos = heapq.heappop(heads)
+            tag_name = streams[index][0]
+            tagged[tag_name] = videos
+            # Nothing can be in every tag once one of them runs out
+            if not advance(index) and tag_name in all_tags:
+                exhausted = True
+        video_ids = None
+        if len(all_tags) > 0:
+            video_ids = set.intersection(*[set(tagged.get(tag, {})) for tag in all_tags])
+        if len(any_tags) > 0:
+            any_ids = set().union(*[set(tagged.get(tag, {})) for tag in any_tags])
+            video_ids = any_ids if video_ids is None else video_ids & any_ids
+        videos = {}
+        for group in tagged.values():
+            videos.update(group)
+        for position, video_id in enumerate(sorted(video_ids)):
+            yield create_time, position, videos[video_id]
+        if exhausted:
+            return
+
+
+@api.route('/videos/search')
+def search_videos(tag_video_data, s3, bucket_name, video_prefix, first_index):
+    all_tags = _split_tags('allTags')
+    any_tags = _split_tags('anyTags')
+    if len(all_tags) == 0 and len(any_tags) == 0:
+        response.status_code = 400
+        return {
+            'message': 'Searching videos requires allTags or anyTags.'
+        }
+    cursor = None
+    if 'nextToken' in request.queryparams:
+        cursor = decode_token(request.queryparams['nextToken'])
+        if not isinstance(cursor, dict) or 'time' not in cursor or 'offset' not in cursor:
+            response.status_code = 400
+            return {
+                'message': f'Invalid nextToken {request.queryparams["nextToken"]}.'
+            }
+    ascending = request.queryparams.get('order', 'descending') == 'ascending'
+    params = QueryParams(
+        sort_ascending=ascending,
+        sort_filters=_create_time_filters(
+            request.queryparams.get('startTime', None),
+            request.queryparams.get('endTime', None),
+            cursor['time'] if cursor is not None else None,
+            ascending))
+    streams = [
+        (tag_name, _tagged_by_create_time(tag_video_data, first_index, tag_name, params))
+        for tag_name in dict.fromkeys(all_tags + any_tags)
+    ]
+    results = _merge_tagged(streams, all_tags, any_tags, ascending)
+    if cursor is not None:
+        results = (
+            result for result in results
+            if result[0] != cursor['time'] or result[1] >= cursor['offset']
+        )
+    limit = get_limit(request)
+    page = list(islice(results, limit))
+    next_token = None
+    if len(page) == limit:
+        create_time, position, _ = page[-1]
+        next_token = encode_token({'time': create_time, 'offset': position + 1})
+    videos = [video for _, _, video in page]
+    if request.queryparams.get('includeUrls', 'false') == 'true':
+        sign_videos(s3, bucket_name, video_prefix, videos)
     return {
-        'items': page.items,
-        'nextToken': page.next_token
+        'items': videos,
+        'nextToken': next_token
     }
 
 
@@ -68,7 +331,7 @@ def delete_tag_from_video(
             }
         }
     ]
-    Repository.batch_write(request.account_id(), updates=updates)
+    return write_updates(request, response, updates)
 
 
 @api.route('/videos/:motion_video/cameras/:camera_name')
@@ -101,43 +364,23 @@ def delete_motion_video(
         video_tag_data,
         motion_video,
         camera_name):
-    updates = [{
-        'repository': motion_videos_data,
-        'parent_ids': [camera_name],
-        'delete': True,
-        'item': {
-            'motionVideo': motion_video
-        }
-    }]
-    params = QueryParams()
-    while True:
-        gen_id = hashed_video(motion_video, camera_name)
-        page = video_tag_data.items(
-            request.account_id(),
-            gen_id,
-            params=params
-        )
-        for item in page.items:
-            updates.append({
-                'repository': tag_video_data,
-                'parent_ids': [item['id']],
-                'delete': True,
-                'item': {
-                    'id': gen_id
-                }
-            })
-            updates.append({
-                'repository': video_tag_data,
-                'parent_ids': [gen_id],
-                'delete': True,
-                'item': {
-                    'id': item['id']
-                }
-            })
-        params = QueryParams(next_token=page.next_token)
-        if params.next_token is None:
-            break
-    Repository.batch_write(request.account_id(), updates=updates)
+    gen_id = hashed_video(motion_video, camera_name)
+    return delete_cascade(request, response, CascadeDelete(
+        request.account_id(),
+        relations=[
+            Relation(video_tag_data, [gen_id], lambda item: [
+                edge_delete(tag_video_data, item['id'], gen_id),
+                edge_delete(video_tag_data, gen_id, item['id']),
+            ], projection=['id'])
+        ],
+        updates=[{
+            'repository': motion_videos_data,
+            'parent_ids': [camera_name],
+            'delete': True,
+            'item': {
+                'motionVideo': motion_video
+            }
+        }]))
 
 
 @api.route('/videos/:motion_video/cameras/:camera_name/url')
@@ -147,5 +390,30 @@ def get_motion_video_url(
         video_prefix,
         motion_video,
         camera_name):
-    s3Key = f'{video_prefix}/{camera_name}/{motion_video}'
+    s3Key = video_key(video_prefix, camera_name, motion_video)
     return generate_presigned_url(s3, bucket_name, s3Key)
+
+
+@api.route('/videos/urls', methods=['POST'])
+def generate_motion_video_urls(s3, bucket_name, video_prefix):
+    input = json.loads(request.body)
+    if 'videos' not in input:
+        response.status_code = 400
+        return {'message': 'Generating urls requires videos.'}
+    if len(input['videos']) > MAX_ITEMS:
+        response.status_code = 400
+        return {
+            'message': f'Provided {len(input["videos"])} is more than {MAX_ITEMS}.'
+        }
+    videos = []
+    for index, video in enumerate(input['videos']):
+        if 'thingName' not in video or 'motionVideo' not in video:
+            response.status_code = 400
+            return {'message': f'Item {index} is missing required fields'}
+        videos.append({
+            'thingName': video['thingName'],
+            'motionVideo': video['motionVideo']
+        })
+    return {
+        'items': sign_videos(s3, bucket_name, video_prefix, videos)
+    }
@@ -0,0 +1,105 @@
+import logging
+from contextvars import copy_context
+from ophis.router import Router
+
+
+logger = logging.getLogger(__name__)
+
+
+class RouteNode:
+    __slots__ = ('static', 'param', 'route')
+
+    def __init__(self) -> None:
+        self.static = {}
+        self.param = None
+        self.route = None
+
+
+class DispatchRouter(Router):
+    """
+    A Router that compiles routes into a segment trie per HTTP method
+    as they are registered. Resolving a request walks one node per path
+    segment, preferring static segments over parameters, instead of
+    searching every registered pattern.
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.dispatch = {}
+        self.paths = []
+
+    def __call__(self, event, context):
+        # Mirrors Router.__call__, with the trie in place of the pattern
+        # scan. The private helpers it reuses are why ophis-py is pinned.
+        logger.debug(f'Incoming event {event}')
+        ctx = copy_context()
+        self._Router__prepare_context(ctx, event, context)
+        for filter in self.filters:
+            kwargs = self._Router__fill_globals(filter)
+            if hasattr(filter, 'routeKey'):
+                output = self._Router__dispatch_route_key(ctx, filter, **kwargs)
+            else:
+                output = ctx.run(filter, **kwargs)
+            if self._Router__is_aborted(ctx):
+                return self._Router__dispatch_response(ctx, output, aborted=True)
+        http = event['requestContext']['http']
+        match = self.resolve(http['method'], http['path'])
+        if match is not None:
+            route, path_values = match
+            logger.info(f'Found {route.__module__}.{route.__name__}')
+            output = self._Router__dispatch_request(ctx, route, path_values)
+            return self._Router__dispatch_response(ctx, output)
+        return {
+            'statusCode': 404,
+            'headers': {'content-type': 'application/json'},
+            'body': '{"message": "Resource not found"}'
+        }
+
+    def route(self, path, methods=["GET"]):
+        register = super().route(path, methods)
+
+        def wrapper(func):
+            register(func)
+            for method in methods:
+                self.insert(method.upper(), path, func)
+            return func
+        return wrapper
+
+    def insert(self, method, path, func):
+        node = self.dispatch.setdefault(method, RouteNode())
+        for segment in path[1:].split('/'):
+            if segment.startswith(':'):
+                if node.param is None:
+                    node.param = RouteNode()
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, RouteNode())
+        if node.route is None:
+            self.paths.append((method, path))
+        node.route = func
+
+    def resolve(self, method, path):
+        root = self.dispatch.get(method, None)
+        if root is None or not path.startswith('/'):
+            return None
+        values = []
+        route = self.__match(root, path[1:].split('/'), 0, values)
+        if route is None:
+            return None
+        return route, values
+
+    def __match(self, node, segments, index, values):
+        if index == len(segments):
+            return node.route
+        segment = segments[index]
+        child = node.static.get(segment, None)
+        if child is not None:
+            route = self.__match(child, segments, index + 1, values)
+            if route is not None:
+                return route
+        if node.param is not None and segment != '':
+            values.append(segment)
+            route = self.__match(node.param, segments, index + 1, values)
+            if route is not None:
+                return route
+            values.pop()
+        return None
@@ -1,10 +1,69 @@
+import os
+from time import time
+from pinthesky.cache import TTLCache
+from pinthesky.concurrency import map_concurrently
 
-def generate_presigned_url(s3, bucket_name, key, expires_in=3600):
-    url = s3.generate_presigned_url(
-        'get_object',
-        Params={'Bucket': bucket_name, 'Key': key},
-        ExpiresIn=expires_in)
+
+SIGNING_CACHE_TTL = int(os.getenv('SIGNING_CACHE_TTL', '1800'))
+MAX_DELETE_KEYS = 1000
+
+# Presigned URLs are reused for no more than half of their expiry, so a
+# cached URL is always valid for a while after it is handed out.
+signing_cache = TTLCache(ttl=SIGNING_CACHE_TTL, max_size=4096)
+
+
+def generate_presigned_url(s3, bucket_name, key, expires_in=3600, cache=signing_cache):
+    now = time()
+    cache_key = (bucket_name, key, expires_in)
+    signed = cache.get(cache_key)
+    if signed is None:
+        url = s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket_name, 'Key': key},
+            ExpiresIn=expires_in)
+        signed = cache.put(
+            cache_key,
+            (url, now + expires_in),
+            ttl=min(cache.ttl, expires_in / 2))
+    url, expires_at = signed
     return {
-        'expiresIn': expires_in,
+        'expiresIn': int(expires_at - now),
         'url': url
     }
+
+
+def video_key(video_prefix, thing_name, motion_video):
+    return f'{video_prefix}/{thing_name}/{motion_video}'
+
+
+def sign_videos(s3, bucket_name, video_prefix, videos, expires_in=3600):
+    """
+    Signs the whole page of videos in one pass, setting the url on each.
+    """
+    for video in videos:
+        video['url'] = generate_presigned_url(
+            s3,
+            bucket_name,
+            video_key(video_prefix, video['thingName'], video['motionVideo']),
+            expires_in=expires_in)
+    return videos
+
+
+def delete_objects(s3, bucket_name, keys):
+    """
+    Deletes the keys in parallel batches of 1,000, returning the errors
+    S3 reported for any key it could not delete.
+    """
+    def delete(chunk):
+        resp = s3.delete_objects(
+            Bucket=bucket_name,
+            Delete={
+                'Objects': [{'Key': key} for key in chunk],
+                'Quiet': True
+            })
+        return resp.get('Errors', [])
+    results = map_concurrently(delete, [
+        keys[start:start + MAX_DELETE_KEYS]
+        for start in range(0, len(keys), MAX_DELETE_KEYS)
+    ])
+    return [error for errors in results for error in errors]
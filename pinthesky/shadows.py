@@ -0,0 +1,90 @@
+import copy
+import json
+import logging
+import os
+
+
+SHADOW_NAME = 'pinthesky'
+SHADOW_CACHE_TTL = int(os.getenv('SHADOW_CACHE_TTL', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+def _merge(document, update):
+    for key, value in update.items():
+        if value is None:
+            document.pop(key, None)
+        elif isinstance(value, dict) and isinstance(document.get(key), dict):
+            _merge(document[key], value)
+        else:
+            document[key] = copy.deepcopy(value)
+    return document
+
+
+def _delta(desired, reported):
+    delta = {}
+    for key, value in desired.items():
+        current = reported.get(key, None) if isinstance(reported, dict) else None
+        if isinstance(value, dict) and isinstance(current, dict):
+            nested = _delta(value, current)
+            if len(nested) > 0:
+                delta[key] = nested
+        elif value != current:
+            delta[key] = value
+    return delta
+
+
+def desired_state(configuration):
+    # In order to be backwards compatible, if the payload
+    # received does not contain a "camera" field, then we
+    # assume that the configuration only applies to the camera
+    # document. Otherwise we will update any subdocument
+    # that targets the thing.
+    if 'camera' not in configuration:
+        return {'camera': configuration}, []
+    return dict(configuration), list(configuration.keys())
+
+
+def get_shadow(iot_data, cache, account_id, thing_name, consistent=False):
+    """
+    Returns the parsed pinthesky shadow for a thing, and whether it was
+    served from the cache. Consistent reads skip, but refresh, the cache.
+    """
+    key = (account_id, thing_name)
+    if not consistent:
+        payload = cache.get(key)
+        if payload is not None:
+            return payload, True
+    thing_resp = iot_data.get_thing_shadow(
+        thingName=thing_name,
+        shadowName=SHADOW_NAME)
+    payload = json.loads(thing_resp['payload'].read())
+    logger.debug(f'Shadow cache for {thing_name} missed: {cache.stats()}')
+    return cache.put(key, payload), False
+
+
+def update_shadow(iot_data, cache, account_id, thing_name, desired):
+    """
+    Updates the desired state of a thing's pinthesky shadow, writing the
+    change through to any cached copy of the shadow.
+    """
+    thing_resp = iot_data.update_thing_shadow(
+        thingName=thing_name,
+        shadowName=SHADOW_NAME,
+        payload=bytes(json.dumps({'state': {'desired': desired}}), encoding="utf8"))
+    r_payload = json.loads(thing_resp['payload'].read())
+    key = (account_id, thing_name)
+    cached = cache.get(key)
+    if cached is not None:
+        payload = copy.deepcopy(cached)
+        state = payload.setdefault('state', {})
+        _merge(state.setdefault('desired', {}), desired)
+        delta = _delta(state['desired'], state.get('reported', {}))
+        if len(delta) > 0:
+            state['delta'] = delta
+        else:
+            state.pop('delta', None)
+        if 'version' in r_payload:
+            payload['version'] = r_payload['version']
+        cache.put(key, payload)
+    return r_payload
@@ -0,0 +1,81 @@
+import json
+import logging
+import random
+from collections import namedtuple
+from ophis.globals import app_context
+from time import perf_counter
+
+
+logger = logging.getLogger(__name__)
+
+Context = namedtuple('Context', field_names=['invoked_function_arn'])
+WARM_EVENT = {
+    'version': '2.0',
+    'routeKey': '$default',
+    'rawPath': '/jobTypes',
+    'rawQueryString': '',
+    'headers': {},
+    'queryStringParameters': {},
+    'requestContext': {
+        'accountId': '000000000000',
+        'http': {
+            'method': 'GET',
+            'path': '/jobTypes',
+        },
+        'routeKey': '$default',
+    },
+}
+
+
+def warm_router(router):
+    resp = router(WARM_EVENT, Context(invoked_function_arn=':'.join([
+        'arn', 'aws', 'lambda', 'us-east-1', '000000000000',
+        'function', 'SnapStart'
+    ])))
+    if resp['statusCode'] != 200:
+        logger.warning(f'Warm request failed with {resp["statusCode"]}')
+
+
+def warm_job_types(job_types):
+    for name in job_types.names():
+        json.loads(job_types[name].render({})[0])
+
+
+def before_checkpoint():
+    """
+    Performs the expensive imports, model loading and first dispatch
+    before the execution environment is snapshotted.
+    """
+    start = perf_counter()
+    import pinthesky.resource as resource
+    resource.load_all_resources()
+    warm_job_types(app_context.resolve('GLOBAL')['job_types'])
+    warm_router(resource.api)
+    app_context.resolve('GLOBAL')['clients'].warm()
+    logger.info(f'Prepared for checkpoint in {perf_counter() - start}s')
+
+
+def after_restore():
+    """
+    Replaces state that must not be shared across restored instances.
+    uuid4 reads os.urandom, but the random module would replay the
+    snapshotted sequence unless reseeded. Connection pools, including
+    the DATA_ENDPOINT iot-data client, point at stale sockets.
+    """
+    start = perf_counter()
+    random.seed()
+    clients = app_context.resolve('GLOBAL')['clients']
+    clients.reset()
+    clients.warm()
+    logger.info(f'Restored from checkpoint in {perf_counter() - start}s')
+
+
+def register():
+    try:
+        from snapshot_restore_py import register_after_restore, register_before_snapshot
+    except ImportError:
+        logger.debug('Runtime does not support SnapStart hooks')
+        return False
+    register_before_snapshot(before_checkpoint)
+    register_after_restore(after_restore)
+    return True
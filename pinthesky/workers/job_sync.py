@@ -0,0 +1,147 @@
+import logging
+import os
+from time import monotonic, time
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import BotoCoreError, ClientError
+from ophis.globals import app_context
+from pinthesky.batch import batch_get, batch_write
+from pinthesky.concurrency import RateLimiter, map_concurrently, past_deadline
+from pinthesky.job_status import JOB_FIELDS, JOB_STATUS_WORKERS, TERMINAL_STATUSES, fetch_status, is_terminal
+from pinthesky.job_status import list_executions, persisted_status, release_targets
+from pinthesky.pages import PageIterator
+
+
+JOB_SYNC_RATE = float(os.getenv('JOB_SYNC_RATE', '5'))
+# The populate invocation is given up on after the longest Lambda run
+POPULATE_TIMEOUT = int(os.getenv('JOB_POPULATE_TIMEOUT', '900'))
+SYNCED_FIELDS = ['status', 'description', 'executionStatus']
+
+logger = logging.getLogger(__name__)
+
+
+def _changed(current, update):
+    if current is None:
+        return True
+    return any(current.get(field, None) != update.get(field, None) for field in SYNCED_FIELDS)
+
+
+def sync_job(iot, job_data, camera_job_data, account_id, job, limiter):
+    """
+    Refreshes the status of a job and each of its executions from IoT,
+    writing back only the items that changed. The job item is only written
+    once every camera item is, so a terminal job is retried until then.
+    """
+    limiter.acquire()
+    status = fetch_status(iot, job)
+    camera_job = {
+        **{key: job[key] for key in JOB_FIELDS if key in job},
+        **status
+    }
+    executions = {}
+    for summary in list_executions(iot, job['jobId'], limiter=limiter):
+        thing_name = summary['thingArn'].split('/')[-1]
+        executions[thing_name] = summary['jobExecutionSummary']['status']
+    thing_names = list(executions.keys())
+    current = batch_get(account_id, reads=[
+        {'id': job['jobId'], 'parent_ids': [thing_name], 'repository': camera_job_data}
+        for thing_name in thing_names
+    ])
+    updates = []
+    for thing_name, item in zip(thing_names, current):
+        update = {**camera_job, 'executionStatus': executions[thing_name]}
+        if _changed(item, update):
+            updates.append({
+                'repository': camera_job_data,
+                'parent_ids': [thing_name],
+                'item': {
+                    **update,
+                    'GS1-PK': camera_job_data.make_hash_key(account_id, thing_name)
+                }
+            })
+    result = batch_write(account_id, updates=updates)
+    if len(result.failures) > 0:
+        logger.warning(f'Failed to sync {len(result.failures)} executions of {job["jobId"]}')
+        return False, len(updates) - len(result.failures)
+    job_updated = _changed(job, status)
+    if job_updated:
+        if is_terminal(status['status']):
+            release_targets(iot, job)
+        job_data.update(account_id, item={
+            'jobId': job['jobId'],
+            'updateTime': job['updateTime'],
+            **status
+        })
+    return job_updated, len(updates)
+
+
+def sync_jobs(
+        iot,
+        job_data,
+        camera_job_data,
+        account_id,
+        index_name,
+        rate=JOB_SYNC_RATE,
+        max_workers=JOB_STATUS_WORKERS,
+        deadline=None,
+        populate_timeout=POPULATE_TIMEOUT):
+    limiter = RateLimiter(rate)
+    stats = {'jobs': 0, 'updatedJobs': 0, 'updatedExecutions': 0, 'stalledJobs': 0, 'failures': 0}
+
+    def stalled(job):
+        if job.get('targetStatus', None) != 'populating':
+            return False
+        return job['createTime'] + populate_timeout < time()
+
+    def sync(job):
+        try:
+            return sync_job(iot, job_data, camera_job_data, account_id, job, limiter)
+        except (BotoCoreError, ClientError) as e:
+            logger.warning(f'Failed to sync job {job["jobId"]}: {e}')
+            return None
+
+    # Terminal jobs are still read, but no longer returned
+    active = ~Attr('status').is_in(TERMINAL_STATUSES)
+    for page in PageIterator(job_data, account_id, index_name=index_name, filter_expression=active):
+        if past_deadline(deadline):
+            break
+        for job in filter(stalled, page.items):
+            # The IoT job, when it was created, is synced from now on
+            logger.warning(f'Populating targets of {job["jobId"]} timed out')
+            job_data.update(account_id, item={
+                'jobId': job['jobId'],
+                'targetStatus': 'failed'
+            })
+            stats['stalledJobs'] += 1
+        jobs = [job for job in page.items if persisted_status(job) is None]
+        for result in map_concurrently(sync, jobs, max_workers=max_workers):
+            stats['jobs'] += 1
+            if result is None:
+                stats['failures'] += 1
+                continue
+            job_updated, updated_executions = result
+            stats['updatedJobs'] += 1 if job_updated else 0
+            stats['updatedExecutions'] += updated_executions
+    return stats
+
+
+def handler(event, context):
+    # Loading the resources injects the clients and repositories the jobs
+    # API uses, which is deferred until the worker is actually invoked
+    from pinthesky.resource import load_resources_for_path
+    from pinthesky.resource.helpers import DEADLINE_BUFFER_MS
+
+    load_resources_for_path('/jobs')
+    resolved = app_context.resolve('GLOBAL')
+    deadline = None
+    if hasattr(context, 'get_remaining_time_in_millis'):
+        remaining = context.get_remaining_time_in_millis() - DEADLINE_BUFFER_MS
+        deadline = monotonic() + remaining / 1000
+    stats = sync_jobs(
+        resolved['iot'],
+        resolved['job_data'],
+        resolved['camera_job_data'],
+        event.get('account', os.getenv('ACCOUNT_ID')),
+        resolved['first_index'],
+        deadline=deadline)
+    logger.info(f'Synchronized jobs: {stats}')
+    return stats
@@ -28,7 +28,7 @@ setup(
     ],
     install_requires=[
         "boto3",
-        "ophis-py"
+        "ophis-py==0.1.0"
     ],
     extra_require={
         'test': ['pytest']
@@ -1,8 +1,12 @@
 import json
-from unittest.mock import MagicMock
+from datetime import datetime, timezone
+from time import monotonic
+from unittest.mock import MagicMock, patch
 from ophis.globals import app_context
 from botocore.client import ClientError
 from io import StringIO
+from pinthesky.batch import BatchResult
+from pinthesky.captures import MAX_TARGETS
 
 
 def test_camera_crud_workflow(cameras):
@@ -47,15 +51,16 @@ def test_camera_crud_workflow(cameras):
             'thingName': f'PitsCamera{index}',
         })
 
-    # Batch get support
+    # Batch get support, in request order
     thing_names = [f'PitsCamera{n}' for n in [3, 6, 9]]
-    params = {'thingName': ','.join(thing_names)}
+    params = {'thingName': ','.join(thing_names + ['Farts', thing_names[0]])}
     batch_get = cameras(query_params=params)
     assert batch_get.body['items'] == [
         cameras(f'/{thing_names[0]}').body,
-        cameras(f'/{thing_names[2]}').body,
-        cameras(f'/{thing_names[1]}').body
+        cameras(f'/{thing_names[1]}').body,
+        cameras(f'/{thing_names[2]}').body
     ]
+    assert batch_get.body['missing'] == ['Farts']
 
     # Paginate
     full_list = cameras().body['items']
@@ -81,6 +86,38 @@ def test_camera_crud_workflow(cameras):
 
     assert cameras('/PitsCamera1/captureImage').code == 200
     assert cameras('/PitsCamera2/captureImage').code == 404
+    s3 = app_context.resolve('GLOBAL')['s3']
+    s3.generate_presigned_url.return_value = 'https://example.com/thumbnail'
+    thumbnails = cameras('/captureImage', query_params={
+        'thingName': 'PitsCamera1,PitsCamera2',
+        'includeUrl': 'true'
+    })
+    assert thumbnails.code == 200
+    assert thumbnails.body['items'][0]['available']
+    assert thumbnails.body['items'][0]['contentLength'] == 100
+    assert thumbnails.body['items'][0]['url']['url'] == 'https://example.com/thumbnail'
+    assert thumbnails.body['items'][1] == {
+        'thingName': 'PitsCamera2',
+        'available': False,
+        'message': 'capture image is not available'
+    }
+    found = s3.head_object.side_effect
+
+    def denied(Bucket, Key):
+        if 'PitsCamera2' in Key:
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'head_object')
+        return found(Bucket=Bucket, Key=Key)
+
+    s3.head_object.side_effect = denied
+    thumbnails = cameras('/captureImage', query_params={
+        'thingName': 'PitsCamera1,PitsCamera2'
+    })
+    assert thumbnails.code == 200
+    assert thumbnails.body['items'][0]['available']
+    assert thumbnails.body['items'][1]['status'] == 'failed'
+    assert not thumbnails.body['items'][1]['available']
+    s3.head_object.side_effect = found
+    assert cameras('/captureImage').code == 400
 
     # Send a capture video request
     assert cameras(
@@ -91,6 +128,26 @@ def test_camera_crud_workflow(cameras):
         }
     ).code == 200
 
+    # Bulk capture requests
+    bulk = cameras('/captureVideo', method='POST', body={
+        'thingNames': ['PitsCamera1', 'PitsCamera3', 'PitsCamera1'],
+        'durationInSeconds': 10
+    })
+    assert bulk.code == 200
+    assert [item['thingName'] for item in bulk.body['items']] == ['PitsCamera1', 'PitsCamera3']
+    assert all(item['status'] == 'succeeded' for item in bulk.body['items'])
+    assert bulk.body['items'][0]['id'] != bulk.body['items'][1]['id']
+    assert cameras('/captureImage', method='POST', body={
+        'thingNames': ['PitsCamera1']
+    }).code == 200
+    assert cameras('/stats', method='POST', body={}).code == 400
+    assert cameras('/stats', method='POST', body={
+        'thingNames': 'PitsCamera1'
+    }).code == 400
+    assert cameras('/stats', method='POST', body={
+        'thingNames': [f'PitsCamera{index}' for index in range(MAX_TARGETS + 1)]
+    }).code == 400
+
     iot_data = MagicMock()
     app_context.inject('iot_data', iot_data, force=True)
 
@@ -186,6 +243,14 @@ def test_camera_crud_workflow(cameras):
             }
         }
     }
+    assert configuration.headers['x-cache'] == 'hit'
+    assert iot_data.get_thing_shadow.call_count == 1
+    configuration = cameras(
+        f'/{cam1["thingName"]}/configuration',
+        query_params={'consistent': 'true'})
+    assert configuration.code == 200
+    assert configuration.headers['x-cache'] == 'miss'
+    assert iot_data.get_thing_shadow.call_count == 2
     assert cameras('/PitsCamera2/configuration').code == 404
 
     def update_thing_shadow(thingName, shadowName, payload):
@@ -236,6 +301,22 @@ def test_camera_crud_workflow(cameras):
         }
     }
 
+    # Updates are written through to the cached shadow
+    configuration = cameras(
+        f'/{cam1["thingName"]}/configuration',
+        query_params={'state': 'desired,delta', 'document': 'camera'})
+    assert configuration.code == 200
+    assert configuration.headers['x-cache'] == 'hit'
+    assert configuration.body == {
+        'desired': {
+            'camera': {
+                'camera_field1': 1,
+                'camera_field2': 2
+            }
+        }
+    }
+    assert iot_data.get_thing_shadow.call_count == 3
+
     assert cameras('/PitsCamera2/configuration', method='POST', body={
         'farts': True
     }).code == 404
@@ -249,3 +330,110 @@ def test_camera_crud_workflow(cameras):
     # Removal
     cameras(f'/{cam1["thingName"]}', method='DELETE')
     assert cameras(f'/{cam1["thingName"]}').code == 404
+
+
+def test_delete_camera_videos(cameras, tags, videos):
+    from pinthesky.resource.helpers import encode_token
+
+    motion_videos = app_context.resolve('GLOBAL')['motion_videos_data']
+    s3 = app_context.resolve('GLOBAL')['s3']
+    titles = [f'{1700000000 + offset}.motion.mp4' for offset in [0, 100, 200]]
+    created = [
+        motion_videos.create(cameras.account_id(), 'PurgeCamera', item={
+            'GS1-PK': motion_videos.make_hash_key(cameras.account_id()),
+            'motionVideo': title,
+            'thingName': 'PurgeCamera',
+            'duration': 30,
+            'expiresIn': 1800000000
+        })
+        for title in titles
+    ]
+    assert tags(method='POST', body={'name': 'Purged'}).code == 200
+    assert tags('/Purged/videos', method='POST', body={
+        'videos': created[:1]
+    }).code == 204
+
+    def time_param(timestamp):
+        return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+    time_range = {
+        'startTime': time_param(1700000000),
+        'endTime': time_param(1700000100)
+    }
+    assert cameras('/PurgeCamera/videos', method='DELETE').code == 400
+    assert cameras('/PurgeCamera/videos', method='DELETE', query_params={
+        **time_range,
+        'nextToken': 'farts'
+    }).code == 400
+
+    # Videos whose object remains are kept
+    s3.delete_objects.return_value = {
+        'Errors': [
+            {
+                'Key': f'videos/PurgeCamera/{titles[1]}',
+                'Code': 'AccessDenied',
+                'Message': 'Access Denied'
+            }
+        ]
+    }
+    purged = cameras('/PurgeCamera/videos', method='DELETE', query_params=time_range)
+    assert purged.code == 200
+    assert purged.body == {
+        'deleted': 1,
+        'failures': [{'motionVideo': titles[1], 'message': 'Access Denied'}]
+    }
+    s3.delete_objects.assert_called_once_with(Bucket='NOT_FOUND', Delete={
+        'Objects': [{'Key': f'videos/PurgeCamera/{title}'} for title in titles[:2]],
+        'Quiet': True
+    })
+    assert tags('/Purged/videos').body['items'] == []
+    remaining = cameras('/PurgeCamera/videos').body['items']
+    assert [video['motionVideo'] for video in remaining] == titles[:0:-1]
+
+    # Videos whose tag edges remain are kept
+    s3.delete_objects.return_value = {}
+    assert tags('/Purged/videos', method='POST', body={
+        'videos': created[2:]
+    }).code == 204
+
+    def fail_edges(*args, updates):
+        return BatchResult(
+            failures=[update for update in updates if update['repository'] is not motion_videos],
+            round_trips=1,
+            retries=0)
+
+    with patch('pinthesky.resource.cameras.batch_write', side_effect=fail_edges):
+        purged = cameras('/PurgeCamera/videos', method='DELETE', query_params={
+            'startTime': time_param(1700000150),
+            'endTime': time_param(1700000250)
+        })
+    assert purged.body == {
+        'deleted': 0,
+        'failures': [{'motionVideo': titles[2], 'message': 'Failed to delete the video tags.'}]
+    }
+    assert len(cameras('/PurgeCamera/videos').body['items']) == 2
+
+    time_range['endTime'] = time_param(1700000200)
+    with patch('pinthesky.resource.cameras.get_deadline', return_value=monotonic()):
+        resumed = cameras('/PurgeCamera/videos', method='DELETE', query_params=time_range)
+    assert resumed.code == 202
+    assert resumed.body['deleted'] == 0
+    tampered = encode_token({**time_range, 'nextToken': 'farts'})
+    assert cameras('/PurgeCamera/videos', method='DELETE', query_params={
+        **time_range,
+        'nextToken': tampered
+    }).code == 400
+    # The token only resumes the range it was issued for
+    assert cameras('/PurgeCamera/videos', method='DELETE', query_params={
+        **time_range,
+        'endTime': time_param(1700000300),
+        'nextToken': resumed.body['nextToken']
+    }).code == 400
+    purged = cameras('/PurgeCamera/videos', method='DELETE', query_params={
+        **time_range,
+        'nextToken': resumed.body['nextToken']
+    })
+    assert purged.body == {'deleted': 2, 'failures': []}
+    assert cameras('/PurgeCamera/videos').body['items'] == []
+    assert tags('/Purged/videos').body['items'] == []
+    s3.delete_objects.reset_mock()
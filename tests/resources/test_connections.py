@@ -1,4 +1,3 @@
-import boto3
 from botocore.exceptions import ClientError
 from ophis.globals import app_context
 from unittest.mock import patch, MagicMock
@@ -7,6 +6,7 @@ from unittest.mock import patch, MagicMock
 def test_connections(connections):
     connection_db = app_context.resolve()['connections']
     session_db = app_context.resolve()['sessions']
+    clients = app_context.resolve()['clients']
 
     empty = connections()
 
@@ -55,7 +55,7 @@ def test_connections(connections):
 
     management = MagicMock()
     management.delete_connection = MagicMock()
-    with patch.object(boto3, 'client', return_value=management) as mock_client:
+    with patch.object(clients, 'client', return_value=management) as mock_client:
         assert connections('/' + created['connectionId'], method='DELETE').code == 204
         mock_client.assert_called_once()
 
@@ -76,6 +76,6 @@ def test_connections(connections):
             }, 'ManagementApi: DeleteConnection')
 
     management.delete_connection = delete_connection
-    with patch.object(boto3, 'client', return_value=management) as mock_client:
+    with patch.object(clients, 'client', return_value=management) as mock_client:
         assert connections('/' + created['connectionId'], method='DELETE').code == 204
         assert connections('/' + created_other['connectionId'], method='DELETE').code == 500
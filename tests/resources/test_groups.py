@@ -1,4 +1,14 @@
 
+import json
+from io import StringIO
+from time import monotonic
+from unittest.mock import MagicMock, patch
+from pinthesky.batch import UnprocessedKeysException
+from botocore.exceptions import ClientError
+from ophis.globals import app_context
+from pinthesky.batch import BatchResult
+
+
 def test_groups_crud_workflow(cameras, groups):
     # List, confirm empty
     assert groups.request().body == {
@@ -29,6 +39,12 @@ def test_groups_crud_workflow(cameras, groups):
     assert groups('/Home', method="PUT", body=home).code == 200
 
     assert groups(query_params={'name': 'Home'}).body['items'][0] == home
+    assert groups(query_params={'name': 'Home,Farts'}).body['missing'] == ['Farts']
+    too_many = ','.join(f'Group{index}' for index in range(1001))
+    assert groups(query_params={'name': too_many}).code == 400
+    throttled = UnprocessedKeysException('Failed to read 1 keys after 8 round trips.')
+    with patch('pinthesky.resource.helpers.batch_get', side_effect=throttled):
+        assert groups(query_params={'name': 'Home,Farts'}).code == 503
 
     cameras(method="POST", body={
         'thingName': 'homeCamera1'
@@ -42,12 +58,101 @@ def test_groups_crud_workflow(cameras, groups):
         'groups': ['Home']
     }).code == 204
 
+    throttled = BatchResult(failures=[{'item': {'id': 'homeCamera3'}}], round_trips=8, retries=7)
+    with patch('pinthesky.resource.helpers.batch_write', return_value=throttled):
+        failed = groups('/Home/cameras', method='POST', body={'cameras': ['homeCamera3']})
+    assert failed.code == 503
+    assert failed.body['failures'] == [{'id': 'homeCamera3'}]
+
     assert cameras('/homeCamera1/groups').body["items"][0]['id'] == 'Home'
     assert groups('/Home/cameras').body["items"][0]['id'] == 'homeCamera1'
+    expanded = groups('/Home/cameras', query_params={'expand': 'camera'})
+    assert expanded.body['items'][0]['camera'] == cameras('/homeCamera1').body
+    assert expanded.body['items'][1]['camera'] is None
+    assert groups('/Home/cameras', query_params={'expand': 'tags'}).code == 400
+    expanded = cameras(query_params={
+        'expand': 'groups,latestStats',
+        'thingName': 'homeCamera1'
+    })
+    assert expanded.body['items'][0]['groups'] == [groups('/Home').body]
+    assert expanded.body['items'][0]['latestStats'] is None
+
+    iot_data = app_context.resolve('GLOBAL')['iot_data']
+    mock_iot_data = MagicMock()
+    app_context.inject('iot_data', mock_iot_data, force=True)
+
+    def update_thing_shadow(thingName, shadowName, payload):
+        if thingName == 'homeCamera2':
+            raise ClientError(error_response={
+                'Error': {'Code': 'ResourceNotFoundException'}
+            }, operation_name='update_thing_shadow')
+        return {
+            'payload': StringIO(initial_value=payload.decode('utf-8'))
+        }
+
+    mock_iot_data.update_thing_shadow.side_effect = update_thing_shadow
+    with patch('pinthesky.resource.groups.get_deadline', return_value=monotonic()):
+        configuration = groups('/Home/configuration', method='POST', body={
+            'camera_field1': 1
+        })
+    assert configuration.code == 200
+    assert configuration.body['items'] == []
+    assert configuration.body['nextToken'] is not None
+    mock_iot_data.update_thing_shadow.assert_not_called()
+
+    assert groups('/Home/configuration', method='POST', body={
+        'camera_field1': 1
+    }, query_params={'nextToken': 'farts'}).code == 400
+
+    configuration = groups('/Home/configuration', method='POST', body={
+        'camera_field1': 1
+    }, query_params={'nextToken': configuration.body['nextToken']})
+    assert configuration.code == 200
+    assert configuration.body['nextToken'] is None
+    items = configuration.body['items']
+    assert [item['thingName'] for item in items] == ['homeCamera1', 'homeCamera2']
+    assert items[0]['status'] == 'succeeded'
+    assert items[1]['status'] == 'failed'
+    mock_iot_data.update_thing_shadow.assert_any_call(
+        thingName='homeCamera1',
+        shadowName='pinthesky',
+        payload=b'{"state": {"desired": {"camera": {"camera_field1": 1}}}}')
+
+    capture = groups('/Home/captureVideo', method='POST', body={
+        'durationInSeconds': 10
+    })
+    assert capture.code == 200
+    assert [item['thingName'] for item in capture.body['items']] == ['homeCamera1', 'homeCamera2']
+    assert mock_iot_data.publish.call_count == 2
+    _, kwargs = mock_iot_data.publish.call_args
+    assert json.loads(kwargs['payload'])['context']['duration'] == 10
+    assert cameras('/captureImage', method='POST', body={
+        'groupName': 'Home'
+    }).body['items'][1]['thingName'] == 'homeCamera2'
+    app_context.inject('iot_data', iot_data, force=True)
+
+    thumbnails = groups('/Home/captureImage').body['items']
+    assert [item['thingName'] for item in thumbnails] == ['homeCamera1', 'homeCamera2']
+    assert not any(item['available'] for item in thumbnails)
 
     assert groups('/Home/cameras/homeCamera1', method="DELETE").code == 204
     assert cameras('/homeCamera1/groups').body["items"] == []
     assert cameras('/homeCamera2/groups/Home', method="DELETE").code == 204
     assert groups('/Home/cameras').body["items"] == []
 
-    assert groups('/Home', method="DELETE").code == 204
+    assert groups('/Home/cameras', method='POST', body={
+        'cameras': ['homeCamera1', 'homeCamera2']
+    }).code == 204
+    with patch('pinthesky.resource.helpers.get_deadline', return_value=monotonic()):
+        deleted = groups('/Home', method="DELETE")
+    assert deleted.code == 202
+    assert groups('/Home').code == 200
+    assert groups('/Home', method="DELETE", query_params={
+        'nextToken': 'farts'
+    }).code == 400
+    assert groups('/Home', method="DELETE", query_params={
+        'nextToken': deleted.body['nextToken']
+    }).code == 204
+    assert groups('/Home').code == 404
+    assert groups('/Home/cameras').body["items"] == []
+    assert cameras('/homeCamera1/groups').body["items"] == []
@@ -7,6 +7,7 @@ from time import sleep
 from unittest.mock import MagicMock
 from ophis.database import MAX_ITEMS
 from ophis.globals import app_context
+from pinthesky.job_status import job_status_cache
 
 
 def test_job_operations(jobs, groups, cameras):
@@ -23,6 +24,16 @@ def test_job_operations(jobs, groups, cameras):
     assert jobs(method="POST", body={}).code == 400
     assert jobs(method="POST", body={'type': 'farts'}).code == 400
     assert jobs(method="POST", body={'type': 'reboot'}).code == 400
+    assert jobs(method="POST", body={
+        'type': 'reboot',
+        'cameras': ['first'],
+        'parameters': {'version': '1.0.0'}
+    }).code == 400
+    assert jobs(method="POST", body={
+        'type': 'update',
+        'cameras': ['first'],
+        'parameters': {'version': {'tag': '1.0.0'}}
+    }).code == 400
 
     # Create a test group and associate some cameras
     assert groups(method="POST", body={'name': 'Home'}).code == 200
@@ -54,7 +65,11 @@ def test_job_operations(jobs, groups, cameras):
     iot_client.create_job = MagicMock()
     iot_client.create_job.side_effect = create_job
 
-    create = jobs(method="POST", body={'type': 'reboot', 'groups': ['Home']})
+    create = jobs(method="POST", body={
+        'type': 'reboot',
+        'cameras': ['first'],
+        'groups': ['Home', 'Home']
+    })
     sleep(1)
     create_up = jobs(
         method="POST",
@@ -190,11 +205,34 @@ def test_job_operations(jobs, groups, cameras):
     iot_client.describe_job = MagicMock()
     iot_client.describe_job.side_effect = describe_job
 
+    # The first terminal read lists the executions once, to persist the
+    # status and to summarize them
+    calls = iot_client.list_job_executions_for_job.call_count
+    summary = jobs(f'/{create.body["jobId"]}/summary')
+    assert summary.code == 200
+    assert iot_client.list_job_executions_for_job.call_count == calls + 1
+    assert summary.body['status'] == 'COMPLETED'
+    assert summary.body['total'] == 1
+    assert summary.body['counts'] == {'QUEUED': 1}
+    assert summary.body['durationMillis']['count'] == 1
+    calls = iot_client.list_job_executions_for_job.call_count
+    assert jobs(f'/{create.body["jobId"]}/summary').body == summary.body
+    assert iot_client.list_job_executions_for_job.call_count == calls
+    assert jobs('/farts/summary').code == 404
+    # The summary is stored apart from the job
     assert jobs(f'/{create.body["jobId"]}').body == {
         **create.body,
         'status': 'COMPLETED',
         'description': 'A something job'
     }
+    # Terminal statuses are persisted and served without IoT
+    assert jobs(f'/{create.body["jobId"]}').body['status'] == 'COMPLETED'
+    iot_client.describe_job.assert_called_once()
+    assert cameras('/first/jobs').body['items'][2] == {
+        **create.body,
+        'status': 'COMPLETED',
+        'description': 'A something job'
+    }
 
     queued_at = datetime.now()
 
@@ -243,6 +281,8 @@ def test_job_operations(jobs, groups, cameras):
         'description': 'This is an updated job'
     }).code == 200
     iot_client.update_job.assert_called_once()
+    assert jobs(f'/{create.body["jobId"]}').body['description'] == 'This is an updated job'
+    iot_client.describe_job.assert_called_once()
 
     def cancel_job_execution(jobId, thingName, **kwargs):
         if thingName == 'farts':
@@ -276,3 +316,129 @@ def test_job_operations(jobs, groups, cameras):
     jobs(f'/{create.body["jobId"]}', method="DELETE")
     iot_client.delete_job.assert_called_once()
     assert jobs(f'/{create.body["jobId"]}').code == 404
+
+
+def test_large_fleet_jobs(jobs, groups, cameras):
+    from pinthesky import api
+    from resources import Context
+
+    iot_client = MagicMock()
+    app_context.inject('iot', iot_client, force=True)
+    clients = app_context.resolve('GLOBAL')['clients']
+    mock_clients = MagicMock()
+    app_context.inject('clients', mock_clients, force=True)
+
+    assert groups(method="POST", body={'name': 'Fleet'}).code == 200
+    assert groups('/Fleet/cameras', method="POST", body={
+        'cameras': [f'fleet{i}' for i in range(30)]
+    }).code == 204
+
+    iot_client.describe_thing_group.side_effect = ClientError({
+        'Error': {
+            'Code': 'ResourceNotFoundException'
+        }
+    }, 'DescribeThingGroup')
+    iot_client.create_thing_group.return_value = {
+        'thingGroupArn': 'arn:aws:iot:us-east-1:123456789012:thinggroup/fleet'
+    }
+    iot_client.create_job.side_effect = lambda jobId, **kwargs: {'jobId': jobId}
+    iot_client.describe_job.return_value = {
+        'job': {
+            'status': 'IN_PROGRESS',
+            'description': 'A reboot job'
+        }
+    }
+
+    create = jobs(method="POST", body={
+        'type': 'reboot',
+        'cameras': ['fleet0'],
+        'groups': ['Fleet'],
+        'largeFleet': True
+    })
+    assert create.code == 200
+    assert create.body['targetStatus'] == 'populating'
+    group_name = create.body['thingGroupName']
+    iot_client.create_job.assert_not_called()
+    populating = jobs(f'/{create.body["jobId"]}').body
+    assert populating['targetStatus'] == 'populating'
+    assert populating['status'] == 'populating'
+    iot_client.describe_job.assert_not_called()
+    assert cameras('/fleet1/jobs').body['items'] == []
+
+    def add_thing_to_thing_group(thingGroupName, thingName):
+        if thingName == 'fleet5':
+            raise ClientError({'Error': {'Code': 'LimitExceededException'}}, 'AddThingToThingGroup')
+
+    iot_client.add_thing_to_thing_group.side_effect = add_thing_to_thing_group
+
+    # Complete the asynchronous invocation
+    _, kwargs = mock_clients.client('lambda').invoke.call_args
+    assert kwargs['InvocationType'] == 'Event'
+    resp = api(json.loads(kwargs['Payload']), Context(
+        invoked_function_arn=kwargs['FunctionName']))
+    assert resp['statusCode'] == 200
+    iot_client.create_thing_group.assert_called_once_with(thingGroupName=group_name)
+    assert iot_client.add_thing_to_thing_group.call_count == 30
+    iot_client.add_thing_to_thing_group.assert_any_call(
+        thingGroupName=group_name,
+        thingName='fleet29')
+    _, kwargs = iot_client.create_job.call_args
+    assert kwargs['jobId'] == create.body['jobId']
+    assert kwargs['targets'] == ['arn:aws:iot:us-east-1:123456789012:thinggroup/fleet']
+    assert kwargs['targetSelection'] == 'SNAPSHOT'
+    assert cameras('/fleet1/jobs').body['items'][0]['jobId'] == create.body['jobId']
+    # A camera that did not join the group is not targeted
+    assert cameras('/fleet5/jobs').body['items'] == []
+    populated = jobs(f'/{create.body["jobId"]}').body
+    assert populated['targetStatus'] == 'populated'
+    assert populated['failedTargets'] == 1
+
+    listed = jobs(query_params={'includeStatus': 'true'}).body['items']
+    assert create.body['jobId'] in [item['jobId'] for item in listed]
+    assert all(item['status'] == 'IN_PROGRESS' for item in listed)
+    assert 'status' not in jobs().body['items'][0]
+
+    # Throttled lookups degrade to an unknown status
+    job_status_cache.clear()
+    iot_client.describe_job.side_effect = ClientError({
+        'Error': {
+            'Code': 'ThrottlingException'
+        }
+    }, 'DescribeJob')
+    listed = cameras('/fleet1/jobs', query_params={'includeStatus': 'true'})
+    assert listed.body['items'][0]['status'] == 'unknown'
+
+    # The thing group is deleted once the job is terminal
+    iot_client.describe_job.side_effect = None
+    iot_client.describe_job.return_value = {
+        'job': {
+            'status': 'COMPLETED',
+            'description': 'A reboot job'
+        }
+    }
+    iot_client.list_job_executions_for_job.return_value = {'executionSummaries': []}
+    assert jobs(f'/{create.body["jobId"]}').body['status'] == 'COMPLETED'
+    iot_client.delete_thing_group.assert_called_once_with(thingGroupName=group_name)
+
+    # A job without any camera in its thing group is canceled
+    iot_client.create_job.reset_mock()
+    iot_client.delete_thing_group.reset_mock()
+    iot_client.add_thing_to_thing_group.side_effect = ClientError({
+        'Error': {
+            'Code': 'LimitExceededException'
+        }
+    }, 'AddThingToThingGroup')
+    create = jobs(method="POST", body={
+        'type': 'reboot',
+        'cameras': ['fleet0'],
+        'largeFleet': True
+    })
+    _, kwargs = mock_clients.client('lambda').invoke.call_args
+    api(json.loads(kwargs['Payload']), Context(invoked_function_arn=kwargs['FunctionName']))
+    iot_client.create_job.assert_not_called()
+    iot_client.delete_thing_group.assert_called_once_with(thingGroupName=create.body['thingGroupName'])
+    canceled = jobs(f'/{create.body["jobId"]}').body
+    assert canceled['targetStatus'] == 'failed'
+    assert canceled['status'] == 'CANCELED'
+
+    app_context.inject('clients', clients, force=True)
@@ -47,12 +47,21 @@ def test_stats_workflow(stats, cameras):
     assert cameras('/PitsCamera1/stats', method="POST", body={}).code == 200
 
     assert stats().body['items'] == created_stats
+    expanded = cameras(query_params={'expand': 'latestStats'}).body['items']
+    assert [c['latestStats'] for c in expanded] == created_stats
+    assert cameras(query_params={'expand': 'farts'}).code == 400
     params = {'thingName': ','.join(['PitsCamera1', 'PitsCamera2'])}
     assert stats(query_params=params).body['items'] == created_stats[0:2]
 
-    # Trying to ask for more than the limit
-    params['limit'] = 1
-    assert stats(query_params=params).code == 400
+    # Reads are not capped by the limit, and report what does not exist
+    params = {
+        'thingName': ','.join(['PitsCamera2', 'PitsCamera1', 'Farts']),
+        'limit': 1
+    }
+    assert stats(query_params=params).body == {
+        'items': [created_stats[1], created_stats[0]],
+        'missing': ['Farts']
+    }
 
     for key, items in historical_views.items():
         assert cameras(f'/{key}/stats').body['items'] == items
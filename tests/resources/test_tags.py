@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from math import floor
 from time import time
+from unittest.mock import MagicMock
 from pinthesky.conversion import hashed_video
 from ophis.globals import app_context
 
@@ -75,8 +77,38 @@ def test_tag_crud_workflow(tags, videos):
         'videos': [video]
     }).code == 204
 
+    expanded = videos(query_params={'expand': 'tags'}).body['items']
+    assert expanded[0]['tags'] == [tags('/Favorites').body]
+    assert videos(query_params={'expand': 'groups'}).code == 400
+
     video['id'] = hashed_video(video['motionVideo'], 'PitsCamera1')
     assert tags('/Favorites/videos').body['items'][0] == video
+
+    s3 = app_context.resolve('GLOBAL')['s3']
+    mock_s3 = MagicMock()
+    mock_s3.generate_presigned_url.return_value = 'https://example.com/video'
+    app_context.inject('s3', mock_s3, force=True)
+    signed = tags('/Favorites/videos', query_params={'includeUrls': 'true'})
+    assert signed.body['items'][0]['url']['url'] == 'https://example.com/video'
+    urls = videos('/urls', method='POST', body={
+        'videos': [video, video]
+    })
+    assert urls.code == 200
+    assert [item['url']['url'] for item in urls.body['items']] == ['https://example.com/video'] * 2
+    # Signatures are reused within their expiry
+    mock_s3.generate_presigned_url.assert_called_once_with(
+        'get_object',
+        Params={
+            'Bucket': app_context.resolve('GLOBAL')['bucket_name'],
+            'Key': f'{app_context.resolve("GLOBAL")["video_prefix"]}/PitsCamera1/{title}'
+        },
+        ExpiresIn=3600)
+    assert videos('/urls', method='POST', body={}).code == 400
+    assert videos('/urls', method='POST', body={
+        'videos': [{'thingName': 'PitsCamera1'}]
+    }).code == 400
+    app_context.inject('s3', s3, force=True)
+
     assert tags(f'/Favorites/videos/{title}', method="DELETE").code == 204
 
     assert tags('/Favorites/videos', method="POST", body={
@@ -84,3 +116,120 @@ def test_tag_crud_workflow(tags, videos):
     }).code == 204
 
     assert tags('/Favorites', method="DELETE").code == 204
+
+
+def test_merged_camera_videos(videos):
+    from pinthesky.resource.helpers import encode_token
+    from pinthesky.resource.videos import MAX_VIDEO_CAMERAS
+    motion_videos = app_context.resolve('GLOBAL')['motion_videos_data']
+    offsets = {
+        'MergeCamera1': [0, 30, 60, 90],
+        'MergeCamera2': [10, 40],
+        'MergeCamera3': [20, 50, 80, 110, 150],
+    }
+    for thing_name, times in offsets.items():
+        for offset in times:
+            motion_videos.create(videos.account_id(), thing_name, item={
+                'motionVideo': f'{1700000000 + offset}.motion.mp4',
+                'thingName': thing_name,
+                'duration': 30
+            })
+
+    def time_param(offset):
+        return datetime.fromtimestamp(1700000000 + offset, timezone.utc).isoformat()
+
+    def list_all(order):
+        params = {
+            'thingName': ','.join(list(offsets.keys()) + ['MergeCamera4']),
+            'startTime': time_param(0),
+            'endTime': time_param(120),
+            'order': order,
+            'limit': 3
+        }
+        items = []
+        while True:
+            page = videos(query_params=params).body
+            assert len(page['items']) <= 3
+            items.extend(page['items'])
+            if page['nextToken'] is None:
+                return items
+            params['nextToken'] = page['nextToken']
+
+    expected = sorted(
+        (1700000000 + offset, thing_name)
+        for thing_name, times in offsets.items()
+        for offset in times if offset <= 120
+    )
+    for order, reverse in [('descending', True), ('ascending', False)]:
+        merged = list_all(order)
+        assert [
+            (int(video['motionVideo'].split('.')[0]), video['thingName'])
+            for video in merged
+        ] == sorted(expected, reverse=reverse)
+
+    assert videos(query_params={
+        'thingName': 'MergeCamera1',
+        'nextToken': 'farts'
+    }).code == 400
+    for cursor in ['farts', 42, {'farts': True}]:
+        assert videos(query_params={
+            'thingName': 'MergeCamera1',
+            'nextToken': encode_token({'MergeCamera1': cursor})
+        }).code == 400
+    assert videos(query_params={
+        'thingName': ','.join(f'MergeCamera{index}' for index in range(MAX_VIDEO_CAMERAS + 1))
+    }).code == 400
+
+
+def test_search_tagged_videos(tags, videos):
+    def video(thing_name, timestamp):
+        return {
+            'motionVideo': f'{timestamp}.motion.mp4',
+            'thingName': thing_name,
+            'duration': 30,
+            'expiresIn': 1800000000
+        }
+    clips = {
+        'v1': video('SearchCamera1', 1600000000),
+        'v2': video('SearchCamera1', 1600000100),
+        'v3': video('SearchCamera1', 1600000200),
+        'v4': video('SearchCamera2', 1600000200),
+        'v5': video('SearchCamera2', 1600000300),
+        'v6': video('SearchCamera1', 1600000400),
+    }
+    tagged = {
+        'person': ['v1', 'v2', 'v3', 'v4', 'v6'],
+        'driveway': ['v2', 'v3', 'v4', 'v5'],
+        'cat': ['v1', 'v5'],
+    }
+    for tag_name, clip_names in tagged.items():
+        assert tags(f'/{tag_name}/videos', method='POST', body={
+            'videos': [clips[name] for name in clip_names]
+        }).code == 204
+
+    names = {(clip['motionVideo'], clip['thingName']): name for name, clip in clips.items()}
+
+    def search(**query_params):
+        items = []
+        while True:
+            page = videos('/search', query_params=query_params).body
+            items.extend(page['items'])
+            if page['nextToken'] is None:
+                return [names[(item['motionVideo'], item['thingName'])] for item in items]
+            query_params['nextToken'] = page['nextToken']
+
+    # Videos created at the same time are ordered by id
+    tie = sorted(['v3', 'v4'], key=lambda name: hashed_video(
+        clips[name]['motionVideo'],
+        clips[name]['thingName']))
+    for limit in [1, 2, 100]:
+        assert search(allTags='person,driveway', limit=limit) == [*tie, 'v2']
+        assert search(anyTags='cat,driveway', limit=limit) == ['v5', *tie, 'v2', 'v1']
+        assert search(allTags='person', anyTags='cat', limit=limit) == ['v1']
+        assert search(allTags='driveway', order='ascending', limit=limit) == ['v2', *tie, 'v5']
+    assert search(
+        allTags='person',
+        startTime=datetime.fromtimestamp(1600000100, timezone.utc).isoformat(),
+        endTime=datetime.fromtimestamp(1600000200, timezone.utc).isoformat()) == [*tie, 'v2']
+    assert videos('/search').code == 400
+    assert videos('/search', query_params={'allTags': 'cat', 'nextToken': 'farts'}).code == 400
@@ -0,0 +1,160 @@
+import pytest
+from botocore.exceptions import ClientError
+from unittest.mock import MagicMock
+from pinthesky.batch import UnprocessedKeysException, backoff_delay, batch_get, batch_write
+from pinthesky.database import Cameras, Groups, GroupsToCameras
+
+
+def test_batch_write():
+    table = MagicMock()
+    table.name = 'Pits'
+    ddb = MagicMock()
+    unprocessed = []
+
+    def batch_write_item(RequestItems):
+        requests = RequestItems['Pits']
+        assert len(requests) <= 25
+        # Every chunk has its last item throttled once
+        if requests[-1] not in unprocessed:
+            unprocessed.append(requests[-1])
+            return {'UnprocessedItems': {'Pits': [requests[-1]]}}
+        return {'UnprocessedItems': {}}
+
+    ddb.batch_write_item.side_effect = batch_write_item
+    group_camera_data = GroupsToCameras(table=table)
+    updates = [
+        {
+            'repository': group_camera_data,
+            'parent_ids': ['Home'],
+            'item': {'id': f'camera{i}'}
+        }
+        for i in range(60)
+    ]
+    updates.append({
+        'repository': Groups(table=table),
+        'item': {'name': 'Home'},
+        'delete': True
+    })
+    # Duplicate keys within a request are not allowed
+    updates.append(updates[0])
+    delays = []
+    result = batch_write('account', updates=updates, ddb=ddb, table=table, sleep=delays.append)
+
+    assert ddb.batch_write_item.call_count == 6
+    assert result.failures == []
+    assert result.round_trips == 6
+    assert result.retries == 3
+    assert len(delays) == 3
+    assert all(0 <= delay <= 0.025 for delay in delays)
+    written = [
+        request
+        for call in ddb.batch_write_item.call_args_list
+        for request in call.kwargs['RequestItems']['Pits']
+    ]
+    assert len(written) == 61 + 3
+    assert {'DeleteRequest': {'Key': {
+        'PK': Groups(table=table).make_hash_key('account'),
+        'SK': 'Home'
+    }}} in written
+
+
+def test_backoff_delay():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt) <= min(1, 0.025 * 2 ** attempt)
+
+
+def test_batch_write_failures():
+    table = MagicMock()
+    table.name = 'Pits'
+    ddb = MagicMock()
+    group_camera_data = GroupsToCameras(table=table)
+    updates = [
+        {
+            'repository': group_camera_data,
+            'parent_ids': ['Home'],
+            'item': {'id': f'camera{i}'}
+        }
+        for i in range(30)
+    ]
+
+    def batch_write_item(RequestItems):
+        requests = RequestItems['Pits']
+        if len(requests) == 5:
+            raise ClientError({'Error': {'Code': 'InternalServerError'}}, 'BatchWriteItem')
+        # The first item is throttled on every attempt
+        return {'UnprocessedItems': {'Pits': requests[:1]}}
+
+    ddb.batch_write_item.side_effect = batch_write_item
+    delays = []
+    result = batch_write(
+        'account',
+        updates=updates,
+        ddb=ddb,
+        table=table,
+        max_attempts=3,
+        sleep=delays.append)
+
+    assert result.round_trips == 4
+    assert result.retries == 2
+    assert len(delays) == 2
+    assert [update['item']['id'] for update in result.failures] == [
+        'camera0',
+        *[f'camera{i}' for i in range(25, 30)]
+    ]
+
+
+def test_batch_get():
+    table = MagicMock()
+    table.name = 'Pits'
+    ddb = MagicMock()
+    cameras = Cameras(table=table)
+    unprocessed = []
+
+    def batch_get_item(RequestItems):
+        keys = RequestItems['Pits']['Keys']
+        assert len(keys) <= 100
+        # Every chunk has its last key throttled once
+        if keys[-1] not in unprocessed:
+            unprocessed.append(keys[-1])
+            keys, throttled = keys[:-1], keys[-1:]
+        else:
+            throttled = []
+        resp = {
+            'Responses': {
+                'Pits': [
+                    {**key, 'thingName': key['SK']}
+                    for key in keys if key['SK'] != 'camera7'
+                ]
+            },
+            'UnprocessedKeys': {}
+        }
+        if len(throttled) > 0:
+            resp['UnprocessedKeys'] = {'Pits': {'Keys': throttled}}
+        return resp
+
+    ddb.batch_get_item.side_effect = batch_get_item
+    thing_names = [f'camera{i}' for i in reversed(range(250))]
+    thing_names.append('camera0')
+    delays = []
+    items = batch_get('account', reads=[
+        {'id': thing_name, 'repository': cameras}
+        for thing_name in thing_names
+    ], ddb=ddb, table=table, sleep=delays.append)
+
+    assert ddb.batch_get_item.call_count == 6
+    assert len(delays) == 3
+    assert len(items) == 251
+    assert [item['thingName'] if item else None for item in items] == [
+        None if thing_name == 'camera7' else thing_name
+        for thing_name in thing_names
+    ]
+
+    ddb.batch_get_item.side_effect = None
+    ddb.batch_get_item.return_value = {
+        'Responses': {},
+        'UnprocessedKeys': {'Pits': {'Keys': [{'PK': 'pk', 'SK': 'camera0'}]}}
+    }
+    with pytest.raises(UnprocessedKeysException):
+        batch_get('account', reads=[
+            {'id': 'camera0', 'repository': cameras}
+        ], ddb=ddb, table=table, max_attempts=2, sleep=delays.append)
@@ -0,0 +1,26 @@
+from pinthesky.cache import TTLCache
+
+
+def test_ttl_cache():
+    now = [0]
+    cache = TTLCache(ttl=10, max_size=2, clock=lambda: now[0])
+
+    assert cache.get('a') is None
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 2}
+
+    # The least recently used entry is evicted
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    now[0] = 10
+    assert cache.get('a') is None
+    assert cache.get('c') is None
+    assert cache.stats()['size'] == 0
+
+    cache.put('d', 4, ttl=5)
+    assert cache.invalidate('d')
+    assert not cache.invalidate('d')
@@ -0,0 +1,52 @@
+import copy
+from botocore.config import Config
+from unittest.mock import MagicMock
+from pinthesky.clients import ClientFactory, DeferredClient
+
+
+def test_client_factory():
+    session = MagicMock()
+    clients = ClientFactory(session=session)
+
+    iot = clients.client('iot')
+    iot_data = clients.client('iot-data', endpoint_url='https://data')
+    table = clients.table('Pits')
+
+    # Nothing is created until it is used
+    session.client.assert_not_called()
+    session.resource.assert_not_called()
+    assert clients.client('iot') is iot
+
+    iot.describe_thing(thingName='PitsCamera1')
+    iot.describe_thing(thingName='PitsCamera2')
+    session.client.assert_called_once_with('iot', config=clients.config)
+    assert 'client:iot' in clients.timings
+
+    assert table.name is not None
+    session.resource.assert_called_once_with('dynamodb', config=clients.config)
+
+    clients.warm()
+    session.client.assert_called_with(
+        'iot-data',
+        config=clients.config,
+        endpoint_url='https://data')
+    assert len(clients.instances) == 4
+
+    clients.reset()
+    assert clients.instances == {}
+    iot_data.publish(topic='test')
+    assert session.client.call_count == 3
+
+    sns = clients.resource('sns', config=Config(read_timeout=10))
+    sns.Topic(arn='arn')
+    config = session.resource.call_args.kwargs['config']
+    assert config.read_timeout == 10
+    assert config.max_pool_connections == clients.config.max_pool_connections
+
+    # Clients asking for the same configuration share one instance
+    assert clients.resource('sns', config=Config(read_timeout=10)) is sns
+    assert clients.resource('sns', config=Config(read_timeout=20)) is not sns
+
+    # Copies are made without __init__, before the factory is set
+    assert copy.copy(sns)._name == sns._name
+    assert not hasattr(DeferredClient.__new__(DeferredClient), 'Topic')
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from pinthesky.job_summary import percentile, summarize_executions
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([10], 99) == 10
+    assert percentile([0, 10, 20, 30], 50) == 15
+    assert percentile(list(range(101)), 90) == 90
+
+
+def test_summarize_executions():
+    started = datetime.now()
+
+    def execution(status, seconds=None):
+        summary = {'status': status, 'queuedAt': started}
+        if seconds is not None:
+            summary['startedAt'] = started
+            summary['lastUpdatedAt'] = started + timedelta(seconds=seconds)
+        return {
+            'thingArn': 'arn:aws:iot:us-east-1:123456789012:thing/first',
+            'jobExecutionSummary': summary
+        }
+
+    assert summarize_executions([]) == {
+        'total': 0,
+        'counts': {},
+        'durationMillis': {'count': 0}
+    }
+    assert summarize_executions([
+        execution('QUEUED'),
+        execution('SUCCEEDED', 1),
+        execution('SUCCEEDED', 2),
+        execution('FAILED', 4),
+    ]) == {
+        'total': 4,
+        'counts': {'QUEUED': 1, 'SUCCEEDED': 2, 'FAILED': 1},
+        'durationMillis': {
+            'count': 3,
+            'min': 1000,
+            'max': 4000,
+            'mean': 2333,
+            'p50': 2000,
+            'p90': 3600,
+            'p99': 3960,
+        }
+    }
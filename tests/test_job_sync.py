@@ -0,0 +1,123 @@
+from math import floor
+from time import time
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+from pinthesky.concurrency import RateLimiter
+from pinthesky.database import DeviceJobs, DeviceToJobs
+from pinthesky.workers.job_sync import sync_jobs
+
+
+def test_rate_limiter():
+    now = [0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.acquire()
+    assert waits == [0.5, 0.5]
+    now[0] += 5
+    limiter.acquire()
+    assert waits == [0.5, 0.5]
+
+
+def test_sync_jobs(table):
+    job_data = DeviceJobs(table=table)
+    camera_job_data = DeviceToJobs(table=table)
+    for job_id, status in [('running', 'IN_PROGRESS'), ('done', 'COMPLETED')]:
+        job_data.create('012345678912', item={
+            'jobId': job_id,
+            'type': 'update',
+            'status': status,
+            'description': 'A job',
+            'thingGroupName': f'pits-targets-{job_id}',
+            'GS1-PK': job_data.make_hash_key('012345678912')
+        })
+    executions = {'CameraOne': 'QUEUED', 'CameraTwo': 'QUEUED'}
+    iot = MagicMock()
+    iot.describe_job.return_value = {
+        'job': {
+            'status': 'IN_PROGRESS',
+            'description': 'A job'
+        }
+    }
+
+    def list_job_executions_for_job(jobId, maxResults):
+        assert jobId == 'running'
+        return {
+            'executionSummaries': [
+                {
+                    'thingArn': f'arn:aws:iot:us-east-1:012345678912:thing/{thing_name}',
+                    'jobExecutionSummary': {'status': status}
+                }
+                for thing_name, status in executions.items()
+            ]
+        }
+
+    iot.list_job_executions_for_job.side_effect = list_job_executions_for_job
+
+    def sync():
+        return sync_jobs(iot, job_data, camera_job_data, '012345678912', 'GS1', rate=0)
+
+    assert sync() == {'jobs': 1, 'updatedJobs': 0, 'updatedExecutions': 2, 'stalledJobs': 0, 'failures': 0}
+    iot.describe_job.assert_called_once_with(jobId='running')
+    item = camera_job_data.get('012345678912', 'CameraOne', item_id='running')
+    assert item['status'] == 'IN_PROGRESS'
+    assert item['executionStatus'] == 'QUEUED'
+
+    # Nothing changed, so nothing is written
+    assert sync() == {'jobs': 1, 'updatedJobs': 0, 'updatedExecutions': 0, 'stalledJobs': 0, 'failures': 0}
+    iot.delete_thing_group.assert_not_called()
+
+    executions['CameraTwo'] = 'SUCCEEDED'
+    iot.describe_job.return_value = {
+        'job': {
+            'status': 'COMPLETED',
+            'description': 'A job'
+        }
+    }
+    assert sync() == {'jobs': 1, 'updatedJobs': 1, 'updatedExecutions': 2, 'stalledJobs': 0, 'failures': 0}
+    item = camera_job_data.get('012345678912', 'CameraTwo', item_id='running')
+    assert item['executionStatus'] == 'SUCCEEDED'
+    assert job_data.get('012345678912', item_id='running')['status'] == 'COMPLETED'
+    iot.delete_thing_group.assert_called_once_with(thingGroupName='pits-targets-running')
+
+    # Terminal jobs are persisted and never synced again
+    assert sync() == {'jobs': 0, 'updatedJobs': 0, 'updatedExecutions': 0, 'stalledJobs': 0, 'failures': 0}
+
+    # A job deleted in IoT is terminal too
+    job_data.create('012345678912', item={
+        'jobId': 'deleted',
+        'type': 'update',
+        'description': 'A deleted job',
+        'GS1-PK': job_data.make_hash_key('012345678912')
+    })
+    not_found = ClientError({'Error': {'Code': 'ResourceNotFoundException'}}, 'DescribeJob')
+    iot.describe_job.side_effect = not_found
+    iot.list_job_executions_for_job.side_effect = not_found
+    assert sync() == {'jobs': 1, 'updatedJobs': 1, 'updatedExecutions': 0, 'stalledJobs': 0, 'failures': 0}
+    assert job_data.get('012345678912', item_id='deleted')['status'] == 'DELETION_IN_PROGRESS'
+    assert sync()['jobs'] == 0
+
+
+def test_sync_stalled_jobs(table):
+    job_data = DeviceJobs(table=table)
+    camera_job_data = DeviceToJobs(table=table)
+    for job_id, create_time in [('stalled', 0), ('populating', floor(time()))]:
+        job_data.create('012345678912', item={
+            'jobId': job_id,
+            'type': 'update',
+            'createTime': create_time,
+            'targetStatus': 'populating',
+            'GS1-PK': job_data.make_hash_key('012345678912')
+        })
+    iot = MagicMock()
+    stats = sync_jobs(iot, job_data, camera_job_data, '012345678912', 'GS1', rate=0)
+    assert stats['stalledJobs'] == 1
+    assert stats['jobs'] == 0
+    iot.describe_job.assert_not_called()
+    assert job_data.get('012345678912', item_id='stalled')['targetStatus'] == 'failed'
+    assert job_data.get('012345678912', item_id='populating')['targetStatus'] == 'populating'
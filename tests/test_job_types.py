@@ -0,0 +1,32 @@
+import json
+import pytest
+from string import Template
+from pinthesky.job_types import InvalidParametersException, JobTypeRegistry
+
+
+def test_job_type_rendering():
+    template = """{
+    "_comment": "Costs $$5",
+    "version": "1.0",
+    "args": ["$pattern", "${lines}", "$missing", "$1"],
+    "runAsUser": "$user"
+}"""
+    registry = JobTypeRegistry({'logs': template})
+    job_type = registry['logs']
+    assert 'logs' in registry
+    assert registry.names() == ['logs']
+    assert job_type.parameters == ['user', 'pattern', 'lines', 'missing']
+    assert job_type.description == 'Costs $5'
+    assert json.loads(registry.listing)['items'] == [job_type.describe()]
+
+    document, parameters = job_type.render({'lines': 20, 'pattern': None})
+    assert parameters == {'user': 'root', 'lines': 20}
+    assert document == Template(template).safe_substitute(**parameters)
+
+    document, _ = job_type.render({'pattern': 'say "hi"\\n'})
+    assert json.loads(document)['args'][0] == 'say "hi"\\n'
+
+    with pytest.raises(InvalidParametersException):
+        job_type.render({'other': 'value'})
+    with pytest.raises(InvalidParametersException):
+        job_type.render({'lines': [1, 2]})
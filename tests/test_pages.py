@@ -0,0 +1,95 @@
+import pytest
+from threading import Event
+from unittest.mock import patch
+from boto3.dynamodb.conditions import Attr
+from ophis.database import QueryParams
+from pinthesky.database import GroupsToCameras
+from pinthesky.pages import PageIterator
+
+
+class CountingTable:
+    def __init__(self, table) -> None:
+        self.table = table
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return self.table.query(**kwargs)
+
+
+def test_page_iterator(table):
+    counting = CountingTable(table)
+    group_cameras = GroupsToCameras(table=table)
+    for index in range(25):
+        group_cameras.create('account', 'Pages', item={
+            'id': f'camera{index:02}',
+            'displayName': f'Camera {index}'
+        })
+    group_cameras.table = counting
+    expected = [f'camera{index:02}' for index in range(25)]
+
+    for read_ahead in [0, 1, 3]:
+        pages = list(PageIterator(
+            group_cameras,
+            'account',
+            'Pages',
+            page_size=10,
+            read_ahead=read_ahead))
+        assert [len(page.items) for page in pages] == [10, 10, 5]
+        assert [item['id'] for page in pages for item in page.items] == expected
+        assert pages[0].items[0]['displayName'] == 'Camera 0'
+
+    # Only the projected fields are read
+    items = list(PageIterator(group_cameras, 'account', 'Pages', projection=['id']).items())
+    assert items == [{'id': camera} for camera in expected]
+
+    # Filtered items are dropped from their page
+    items = list(PageIterator(
+        group_cameras,
+        'account',
+        'Pages',
+        page_size=10,
+        filter_expression=Attr('displayName').begins_with('Camera 1')).items())
+    assert [item['id'] for item in items] == ['camera01'] + expected[10:20]
+
+    # Resumes from a next token
+    first = group_cameras.items('account', 'Pages', params=QueryParams(limit=20))
+    pages = PageIterator(
+        group_cameras,
+        'account',
+        'Pages',
+        params=QueryParams(next_token=first.next_token),
+        read_ahead=0)
+    assert [item['id'] for item in pages.items()] == expected[20:]
+
+    # Breaking out stops fetching pages
+    counting.queries.clear()
+    for page in PageIterator(group_cameras, 'account', 'Pages', page_size=5, read_ahead=0):
+        break
+    assert len(counting.queries) == 1
+    counting.queries.clear()
+    for page in PageIterator(group_cameras, 'account', 'Pages', page_size=5, read_ahead=1):
+        break
+    # The consumed page, the queued page, and at most one in flight
+    assert len(counting.queries) <= 3
+
+    # A single page is read without a producer thread
+    with patch('pinthesky.pages.threading.Thread') as thread:
+        pages = list(PageIterator(group_cameras, 'account', 'Pages', read_ahead=1))
+        assert [len(page.items) for page in pages] == [25]
+        thread.assert_not_called()
+
+
+def test_page_iterator_errors(table):
+    group_cameras = GroupsToCameras(table=table)
+    fetched = Event()
+
+    class FailingTable:
+        def query(self, **kwargs):
+            fetched.set()
+            raise ValueError('Failed to query')
+
+    group_cameras.table = FailingTable()
+    with pytest.raises(ValueError):
+        list(PageIterator(group_cameras, 'account', 'Pages'))
+    assert fetched.is_set()
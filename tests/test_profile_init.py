@@ -0,0 +1,37 @@
+from pinthesky.profile_init import aggregate_imports, parse_importtime, subsystem_of
+
+
+def test_import_aggregation():
+    lines = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       100 |        100 | encodings',
+        'import time:       300 |        300 |       botocore.utils',
+        'import time:       200 |        500 |     boto3',
+        'import time:        50 |        550 |   pinthesky.clients',
+        'import time:       400 |        400 |     dateutil.parser',
+        'import time:        10 |        410 |   pinthesky.conversion',
+        'import time:        20 |        20 |   pinthesky.resource.cameras',
+        'import time:        30 |       1010 | pinthesky.resource',
+    ]
+    rows = parse_importtime(lines)
+    assert rows[0] == ('pinthesky.resource', 0, 30)
+    assert rows[-1] == ('encodings', 0, 100)
+
+    assert subsystem_of('pinthesky') == 'pinthesky'
+    assert subsystem_of('pinthesky.resource.cameras') == 'resource.cameras'
+    assert subsystem_of('pinthesky.conversion') == 'conversion'
+    assert subsystem_of('boto3') is None
+
+    report = aggregate_imports(rows, slowest=2)
+    assert report['subsystems'] == {
+        'clients': {'seconds': 550 / 1e6, 'modules': 3},
+        'conversion': {'seconds': 410 / 1e6, 'modules': 2},
+        '(startup)': {'seconds': 100 / 1e6, 'modules': 1},
+        'resource': {'seconds': 30 / 1e6, 'modules': 1},
+        'resource.cameras': {'seconds': 20 / 1e6, 'modules': 1},
+    }
+    assert report['packages']['pinthesky'] == 110 / 1e6
+    assert report['slowest'] == [
+        {'module': 'dateutil.parser', 'seconds': 400 / 1e6},
+        {'module': 'botocore.utils', 'seconds': 300 / 1e6},
+    ]
@@ -0,0 +1,70 @@
+import json
+from ophis.globals import request, response
+from pinthesky.router import DispatchRouter
+
+
+def _event(method, path):
+    return {
+        'requestContext': {
+            'accountId': '123456789012',
+            'http': {
+                'method': method,
+                'path': path
+            }
+        }
+    }
+
+
+def test_dispatch_router():
+    api = DispatchRouter()
+
+    @api.filter()
+    def abort_options():
+        if request.method() == 'OPTIONS':
+            response.break_continuation()
+
+    @api.route('/videos/:motion_video/cameras/:camera_name')
+    def get_video(motion_video, camera_name):
+        return {'video': motion_video, 'camera': camera_name}
+
+    @api.route('/videos/search')
+    def search():
+        return {'search': True}
+
+    @api.route('/videos/:motion_video')
+    def get_motion_video(motion_video):
+        return {'video': motion_video}
+
+    @api.route('/videos', methods=['GET', 'POST'])
+    def videos():
+        return {'method': request.method()}
+
+    assert api.resolve('GET', '/videos/search') == (search, [])
+    assert api.resolve('GET', '/videos/other') == (get_motion_video, ['other'])
+    assert api.resolve('GET', '/videos/1.mp4/cameras/Cam1') == (
+        get_video, ['1.mp4', 'Cam1'])
+    assert api.resolve('GET', '/videos/search/cameras/Cam1') == (
+        get_video, ['search', 'Cam1'])
+    assert api.resolve('GET', '/videos/1.mp4/cameras') is None
+    assert api.resolve('GET', '/videos/') is None
+    assert api.resolve('GET', '/videos//cameras/Cam1') is None
+    assert api.resolve('DELETE', '/videos') is None
+    assert len(api.paths) == 5
+
+    # Registering a path again replaces the route without listing it twice
+    @api.route('/videos/:video_id', methods=['GET'])
+    def get_video_by_id(video_id):
+        return {'video': video_id}
+
+    assert api.resolve('GET', '/videos/other') == (get_video_by_id, ['other'])
+    assert len(api.paths) == 5
+
+    resp = api(_event('POST', '/videos'), None)
+    assert resp['statusCode'] == 200
+    assert json.loads(resp['body']) == {'method': 'POST'}
+    resp = api(_event('GET', '/videos/1.mp4/cameras/Cam1'), None)
+    assert json.loads(resp['body']) == {'video': '1.mp4', 'camera': 'Cam1'}
+    resp = api(_event('OPTIONS', '/videos'), None)
+    assert resp['statusCode'] == 200
+    assert resp['body'] is None
+    assert api(_event('GET', '/cameras'), None)['statusCode'] == 404
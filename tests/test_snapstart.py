@@ -0,0 +1,33 @@
+import sys
+import types
+from ophis.globals import app_context
+
+
+def test_snapstart_hooks(table, monkeypatch):
+    assert table.name == 'Pits'
+    from pinthesky import snapstart
+    import pinthesky.resource as resource
+
+    before, after = [], []
+    runtime = types.ModuleType('snapshot_restore_py')
+    runtime.register_before_snapshot = before.append
+    runtime.register_after_restore = after.append
+    monkeypatch.setitem(sys.modules, 'snapshot_restore_py', runtime)
+    assert snapstart.register()
+    assert before == [snapstart.before_checkpoint]
+    assert after == [snapstart.after_restore]
+
+    clients = app_context.resolve()['clients']
+    snapstart.before_checkpoint()
+    assert set(resource.loaded_resources.keys()) == set(
+        name for names in resource.RESOURCE_MANIFEST.values() for name in names
+    ) | {'inject'}
+    assert clients.instances.keys() == clients.deferred.keys()
+
+    iot_data = [v for k, v in clients.instances.items() if 'iot-data' in k]
+    snapstart.after_restore()
+    assert clients.instances.keys() == clients.deferred.keys()
+    assert iot_data[0] not in clients.instances.values()
+
+    monkeypatch.setitem(sys.modules, 'snapshot_restore_py', None)
+    assert not snapstart.register()